@@ -1,10 +1,118 @@
 import sqlite3 
 import sys, os 
+import ast
+import json
+import random
+import re
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+import zlib
 
 # conn = sqlite3.connect('C:/Users/Ta/Documents/test/ta.db')
 # conn = sqlite3.connect(':memory:')
 # queryCurs = conn.cursor()
 
+# shared connections keyed by (db path, thread). kept across reload(db) so the apps 
+# reuse the same connection instead of reconnecting to the share on every query. 
+# sqlite connections can only be used by the thread that opened them 
+try : 
+    _connections
+except NameError : 
+    _connections = dict()
+
+# open transaction depth keyed by id of connection 
+try : 
+    _transactions
+except NameError : 
+    _transactions = dict()
+
+# readDatabase result keyed by db path, with hit / miss counters 
+try : 
+    _readCache
+except NameError : 
+    _readCache = dict()
+    _cacheStats = {'hit': 0, 'miss': 0}
+
+# seconds sqlite waits on a locked db before raising 
+busyTimeout = 30.0
+
+# retry of lock errors after busy timeout. delay doubles each attempt 
+retryCount = 5
+retryDelay = 0.2
+
+# journal mode override, e.g. MATTE_DB_JOURNAL=delete 
+journalEnv = 'MATTE_DB_JOURNAL'
+networkFsTypes = ['nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'fuse.sshfs']
+
+# optional local read replica. reads are served from a copy under this dir, 
+# writes go to master and mark it stale. off unless set by env or setReplicaDir 
+replicaEnv = 'MATTE_DB_REPLICA'
+replicaDir = os.environ.get(replicaEnv, '')
+
+# seconds between checks of master for changes 
+replicaCheckInterval = 5.0
+
+# master signature and last check time of each replica keyed by master path 
+try : 
+    _replicaState
+except NameError : 
+    _replicaState = dict()
+
+# offline journal. exports made while the share is unreachable are appended here 
+# and merged into the master db by replayJournal 
+offlineEnv = 'MATTE_DB_OFFLINE'
+offlineDir = os.environ.get(offlineEnv, os.path.join(os.path.expanduser('~'), 'matteDbOffline'))
+
+# seconds after which a journal claimed by replayJournal counts as left by a crashed session 
+journalClaimTimeout = 600.0
+
+# local db service (db_service.py) at host:port. writes of all sessions on this machine go 
+# through it instead of locking the db file on the share. off uses the db file only 
+serviceEnv = 'MATTE_DB_SERVICE'
+serviceAddress = os.environ.get(serviceEnv, '127.0.0.1:47831')
+
+# seconds to reach service, and to wait for its reply of a queued write 
+serviceConnectTimeout = 0.5
+serviceTimeout = 300.0
+
+# seconds the db file is used directly after service was not reachable 
+serviceRetryInterval = 30.0
+
+# errors of service requests raised again in the client, others as RuntimeError 
+serviceErrors = dict([(a.__name__, a) for a in [ValueError, KeyError, TypeError, sqlite3.Error, sqlite3.DatabaseError, 
+                sqlite3.OperationalError, sqlite3.IntegrityError, sqlite3.ProgrammingError]])
+
+# sql instrumentation, off unless MATTE_DB_PROFILE is set. a number sets the slow query 
+# threshold in ms. statements slower than slowQueryTime seconds go to slowQueryLog as json lines 
+profileEnv = 'MATTE_DB_PROFILE'
+profiling = bool(os.environ.get(profileEnv))
+
+try : 
+    slowQueryTime = float(os.environ.get(profileEnv)) / 1000.0
+
+except (TypeError, ValueError) : 
+    slowQueryTime = 0.5
+
+slowQueryLog = os.path.join(os.path.expanduser('~'), 'matteDbSlow.log')
+
+# {(call site, statement): {'calls', 'time', 'rows'}} of instrumented connections 
+try : 
+    _profileStats
+except NameError : 
+    _profileStats = dict()
+    _profileLock = threading.Lock()
+
+# service socket of each thread and time until service is tried again 
+try : 
+    _serviceLocal
+except NameError : 
+    _serviceLocal = threading.local()
+    _serviceState = {'downUntil': 0.0}
+
 
 def dbPath(project) : 
     path = 'P:/%s/.local/vrayMatteID.db' % project
@@ -14,7 +122,8 @@ def dbPathCustom(project, dbName) :
     path = 'P:/%s/.local/%s.db' % (project, dbName)
     return path 
 
-def readDatabase(project, dbName='') : 
+def openDatabase(project, dbName='') : 
+    """ create db of project if missing, else upgrade its schema. return db path """
     path = dbPath(project)
     
     if dbName: 
@@ -27,21 +136,615 @@ def readDatabase(project, dbName='') :
 
     if not os.path.exists(path) : 
         # create db 
-        sql = sqlite3.connect(path)
+        sql = connect(path)
         createTable(sql)
         print 'DB created'
 
     else : 
-        sql = sqlite3.connect(path)
-        print 'Reading db' 
+        sql = connect(path)
+        upgradeSchema(sql)
+
+    return path
+
+
+def readDatabase(project, dbName='') : 
+    """ all ObjectID records as list. use iterDatabase or readColumn when one page or column is enough """
+    return readDatabaseFile(openDatabase(project, dbName))
+
+
+def readDatabaseFile(path) : 
+    """ readDatabase of a db path, cached until db content changes """
+    # served from local replica if enabled 
+    sql = reader(path)
+    path = sql.path
+    key = os.path.normpath(path)
+    version = dataVersion(sql, path)
+    cache = _readCache.get(key)
+
+    if cache and cache[0] == version : 
+        _cacheStats['hit'] += 1
+        return list(cache[1])
+
+    print 'Reading db' 
+    _cacheStats['miss'] += 1
 
     result = queryObjectIDTable(sql)
     result = captureData(result)
-    sql.close()
+    _readCache[key] = (version, result)
+
+    return list(result)
+
+
+def dataVersion(sql, path) : 
+    """ changes whenever db content changes. data_version catches commits of other 
+        connections, total_changes the ones of this connection. file stat if sqlite has no data_version 
+    """
+    result = sql.execute('PRAGMA data_version').fetchone()
+
+    if result is None : 
+        stat = os.stat(path)
+        result = (stat.st_mtime, stat.st_size)
+
+    return (id(sql), result[0], sql.total_changes)
+
+
+def cacheStats() : 
+    """ readDatabase cache hit / miss counters and cached db paths """
+    stats = dict(_cacheStats)
+    stats['paths'] = sorted(_readCache.keys())
+
+    return stats
+
+
+def clearCache(path=None) : 
+    """ drop cached readDatabase result of path, or of all paths """
+    if path is None : 
+        _readCache.clear()
+
+    else : 
+        _readCache.pop(os.path.normpath(path), None)
+
+
+def connect(path) : 
+    """ return shared connection of db path for current thread. open a new one if not connected yet """
+    path = os.path.normpath(path)
+    key = (path, threading.current_thread().ident)
+    sql = _connections.get(key)
+
+    if sql is None : 
+        factory = ProfiledConnection if profiling else Connection
+        sql = sqlite3.connect(path, timeout=busyTimeout, factory=factory, cached_statements=statementCacheSize)
+        sql.path = path
+        # delete triggers also run for rows removed by INSERT OR REPLACE, keeps free range index right 
+        sql.execute('PRAGMA recursive_triggers = ON')
+        setJournalMode(sql, path)
+        _connections[key] = sql
+
+    return sql
+
+
+class Connection(sqlite3.Connection) : 
+    """ sqlite connection that knows its db path """
+    path = ''
+
+
+# sql instrumentation 
+
+def callSite() : 
+    """ 'module.function:line > accessor' of the code outside create_db that runs a statement """
+    frame = sys._getframe(1)
+    accessor = ''
+
+    while frame and frame.f_code.co_filename == callSite.__code__.co_filename : 
+        accessor = frame.f_code.co_name
+        frame = frame.f_back
+
+    if frame is None : 
+        return accessor
+
+    module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+
+    return '%s.%s:%s > %s' % (module, frame.f_code.co_name, frame.f_lineno, accessor)
+
+
+def statementKey(statement) : 
+    """ statement text without layout, IN lists of any size counted as one statement """
+    statement = ' '.join(statement.split())
+    return re.sub(r'\?(\s*,\s*\?)+', '?, ...', statement)
+
+
+def recordStatement(path, site, statement, elapsed, rows) : 
+    """ add finished statement to profile, and to slow query log if slower than slowQueryTime """
+    key = (site, statementKey(statement))
+
+    with _profileLock : 
+        stat = _profileStats.setdefault(key, {'calls': 0, 'time': 0.0, 'rows': 0})
+        stat['calls'] += 1
+        stat['time'] += elapsed
+        stat['rows'] += rows
+
+        if elapsed < slowQueryTime : 
+            return 
+
+        entry = {'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'ms': round(elapsed * 1000, 1), 'rows': rows, 
+                'site': site, 'statement': key[1], 'db': path, 'user': os.environ.get('USERNAME', os.environ.get('USER', ''))}
+
+        try : 
+            with open(slowQueryLog, 'a') as f : 
+                f.write(json.dumps(entry) + '\n')
+
+        except IOError as e : 
+            print 'Cannot write slow query log %s : %s' % (slowQueryLog, e)
+
+
+class ProfiledCursor(sqlite3.Cursor) : 
+    """ cursor timing each statement from execute until its last row is fetched """
+    statement = None
+
+    def finish(self) : 
+        if self.statement is not None : 
+            recordStatement(self.connection.path, self.site, self.statement, self.elapsed, self.rows)
+            self.statement = None
+
+    def start(self, statement) : 
+        self.finish()
+        self.statement = statement
+        self.site = callSite()
+        self.elapsed = 0.0
+        self.rows = 0
+
+    def execute(self, statement, params=()) : 
+        self.start(statement)
+        start = time.time()
+
+        try : 
+            sqlite3.Cursor.execute(self, statement, params)
+
+        finally : 
+            self.elapsed += time.time() - start
+
+        # no result rows to wait for 
+        if self.description is None : 
+            self.rows = max(self.rowcount, 0)
+            self.finish()
+
+        return self
+
+    def executemany(self, statement, rows) : 
+        self.start(statement)
+        start = time.time()
+
+        try : 
+            sqlite3.Cursor.executemany(self, statement, rows)
+
+        finally : 
+            self.elapsed += time.time() - start
+
+        self.rows = max(self.rowcount, 0)
+        self.finish()
+
+        return self
+
+    def fetched(self, start, rows, done) : 
+        self.elapsed += time.time() - start
+        self.rows += rows
+
+        if done : 
+            self.finish()
+
+    def next(self) : 
+        start = time.time()
+
+        try : 
+            record = sqlite3.Cursor.next(self)
+
+        except StopIteration : 
+            self.fetched(start, 0, True)
+            raise
+
+        self.fetched(start, 1, False)
+
+        return record
+
+    def fetchone(self) : 
+        start = time.time()
+        record = sqlite3.Cursor.fetchone(self)
+        self.fetched(start, int(record is not None), record is None)
+
+        return record
+
+    def fetchmany(self, size=None) : 
+        start = time.time()
+        size = size or self.arraysize
+        records = sqlite3.Cursor.fetchmany(self, size)
+        self.fetched(start, len(records), len(records) < size)
+
+        return records
+
+    def fetchall(self) : 
+        start = time.time()
+        records = sqlite3.Cursor.fetchall(self)
+        self.fetched(start, len(records), True)
+
+        return records
+
+    def close(self) : 
+        self.finish()
+        sqlite3.Cursor.close(self)
+
+    def __del__(self) : 
+        # statement read only partly, e.g. fetchone of a lookup 
+        self.finish()
+
+
+class ProfiledConnection(Connection) : 
+    """ connection of profiling mode. statements run through ProfiledCursor, commits are timed too """
+    def cursor(self, factory=ProfiledCursor) : 
+        return Connection.cursor(self, factory)
+
+    def commit(self) : 
+        start = time.time()
+
+        try : 
+            Connection.commit(self)
+
+        finally : 
+            recordStatement(self.path, callSite(), 'COMMIT', time.time() - start, 0)
+
+
+def setProfiling(on) : 
+    """ turn sql instrumentation on or off. shared connections are reopened with it """
+    global profiling
+    profiling = bool(on)
+    disconnect()
+
+
+def profileStats() : 
+    """ [{'site', 'statement', 'calls', 'time', 'rows'}] of instrumented statements, slowest total first """
+    with _profileLock : 
+        result = [dict(stat, site=key[0], statement=key[1]) for key, stat in _profileStats.items()]
+
+    return sorted(result, key=lambda a: a['time'], reverse=True)
+
+
+def resetProfile() : 
+    """ clear profile of instrumented statements """
+    with _profileLock : 
+        _profileStats.clear()
+
+
+def printProfile(limit=20) : 
+    """ print slowest call sites of profile """
+    for stat in profileStats()[: limit] : 
+        print '%10.1f ms %6s x %8s rows  %s  %s' % (stat['time'] * 1000, stat['calls'], stat['rows'], stat['site'], stat['statement'][: 80])
+
+
+def reader(path) : 
+    """ connection for read only queries. local replica of path if replica mode is on """
+    if not replicaDir : 
+        return connect(path)
+
+    try : 
+        return connect(syncReplica(path))
+
+    except (sqlite3.Error, IOError, OSError) as e : 
+        # replica not usable, read master directly until next check 
+        print 'Cannot use replica of %s : %s' % (path, e)
+        markReplicaStale(path, time.time())
+        return connect(path)
+
+
+def setReplicaDir(path) : 
+    """ turn replica mode on with replicas under path. empty path turns it off """
+    global replicaDir
+
+    for master in _replicaState.keys() : 
+        disconnect(replicaPath(master))
+
+    _replicaState.clear()
+    replicaDir = path
+
+
+def replicaPath(path) : 
+    """ local replica path of master db. P:/Lego_X/.local/a.db -> <replicaDir>/Lego_X/.local/a.db """
+    relPath = os.path.splitdrive(os.path.normpath(path))[1].lstrip('\\/')
+    return os.path.normpath(os.path.join(replicaDir, relPath))
+
+
+def masterSignature(path) : 
+    """ mtime, size and sqlite file change counter of master db. wal file too, commits land there in wal mode """
+    stat = os.stat(path)
+    f = open(path, 'rb')
+
+    try : 
+        f.seek(24)
+        counter = struct.unpack('>I', f.read(4) or '\0' * 4)[0]
+
+    finally : 
+        f.close()
+
+    walStat = (0, 0)
+
+    if os.path.exists(path + '-wal') : 
+        wal = os.stat(path + '-wal')
+        walStat = (wal.st_mtime, wal.st_size)
+
+    return (stat.st_mtime, stat.st_size, counter, walStat)
+
+
+def markReplicaStale(path, checked=0.0) : 
+    """ replica of path is copied again on next read. reads go to master until then, 
+        or until replicaCheckInterval after checked 
+    """
+    _replicaState[os.path.normpath(path)] = (None, checked)
+
+
+def syncReplica(path, force=False) : 
+    """ copy master to replica if master changed since last copy. return path to read from, 
+        which is master while the replica is stale and its last copy failed 
+    """
+    path = os.path.normpath(path)
+    replica = replicaPath(path)
+    state = _replicaState.get(path)
+    now = time.time()
+
+    if not force and state and now - state[1] < replicaCheckInterval : 
+        # last copy failed, do not try again on every read 
+        if state[0] is None : 
+            return path
+
+        # skip network round trip if master was checked recently 
+        if os.path.exists(replica) : 
+            return replica
+
+    signature = masterSignature(path)
+
+    if not force and state and state[0] == signature and os.path.exists(replica) : 
+        _replicaState[path] = (signature, now)
+        return replica
+
+    replicaDbDir = os.path.dirname(replica)
+
+    if not os.path.exists(replicaDbDir) : 
+        os.makedirs(replicaDbDir)
+
+    fd, tmpPath = tempfile.mkstemp(suffix='.db', dir=replicaDbDir)
+    os.close(fd)
+    os.remove(tmpPath)
+
+    try : 
+        copyDatabase(path, tmpPath)
+
+        # replica file is replaced, its connection has to go first 
+        disconnect(replica)
+
+        for ext in ['', '-journal', '-wal', '-shm'] : 
+            if os.path.exists(replica + ext) : 
+                os.remove(replica + ext)
+
+        os.rename(tmpPath, replica)
+
+    finally : 
+        if os.path.exists(tmpPath) : 
+            os.remove(tmpPath)
+
+    _replicaState[path] = (signature, now)
+    print 'Replica updated %s' % replica
+
+    return replica
+
+
+def copyDatabase(path, target) : 
+    """ consistent copy of db while other sessions may write to it """
+    sql = connect(path)
+
+    if sqlite3.sqlite_version_info >= (3, 27, 0) : 
+        sql.execute('VACUUM INTO ?', (target, ))
+        return
+
+    # older sqlite, copy the file under a read lock so no writer can change it meanwhile. 
+    # in wal mode commits have to be moved into the db file first 
+    if sql.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal' : 
+        sql.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    isolationLevel = sql.isolation_level
+    sql.isolation_level = None
+
+    try : 
+        sql.execute('BEGIN')
+        sql.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+
+        if os.path.exists(path + '-wal') and os.path.getsize(path + '-wal') : 
+            raise sqlite3.OperationalError('wal of %s not checkpointed' % path)
+
+        shutil.copyfile(path, target)
+
+    finally : 
+        sql.execute('ROLLBACK')
+        sql.isolation_level = isolationLevel
+
+
+def isNetworkPath(path) : 
+    """ True if path is on a network share, where WAL shared memory is not safe """
+    path = os.path.abspath(path)
+
+    if path.startswith('\\\\') or path.startswith('//') : 
+        return True
+
+    if sys.platform == 'win32' : 
+        drive = os.path.splitdrive(path)[0]
+
+        if drive : 
+            import ctypes
+            # DRIVE_REMOTE 
+            return ctypes.windll.kernel32.GetDriveTypeW(u'%s\\' % drive) == 4
+
+    elif os.path.exists('/proc/mounts') : 
+        mountPoint = ''
+        fsType = ''
+
+        for line in open('/proc/mounts') : 
+            info = line.split()
+
+            if len(info) > 2 and (path + '/').startswith(info[1].rstrip('/') + '/') and len(info[1]) >= len(mountPoint) : 
+                mountPoint = info[1]
+                fsType = info[2]
+
+        return fsType in networkFsTypes
+
+    return False
+
+
+def setJournalMode(sql, path) : 
+    """ WAL on local disk, rollback journal on network share. return mode in use """
+    mode = os.environ.get(journalEnv)
+
+    if replicaDir and os.path.normpath(path).startswith(os.path.normpath(replicaDir) + os.sep) : 
+        # replica is replaced by file copy, keep it in a single file 
+        mode = 'delete'
+
+    elif not mode : 
+        mode = 'delete' if isNetworkPath(path) else 'wal'
+
+    try : 
+        result = sql.execute('PRAGMA journal_mode = %s' % mode).fetchone()[0]
+
+    except sqlite3.OperationalError as e : 
+        # db busy, keep mode set by whoever holds it 
+        print 'Cannot set journal mode %s : %s' % (mode, e)
+        return sql.execute('PRAGMA journal_mode').fetchone()[0]
+
+    if result.lower() != mode.lower() : 
+        # wal not supported by file system, stay on rollback journal 
+        print 'Journal mode %s not available, use %s' % (mode, result)
 
     return result
 
 
+def isLockError(error) : 
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def retry(func, *args, **kwargs) : 
+    """ call func, retry with backoff while db is locked by another session """
+    for attempt in range(retryCount + 1) : 
+        try : 
+            return func(*args, **kwargs)
+
+        except sqlite3.OperationalError as e : 
+            if not isLockError(e) or attempt == retryCount : 
+                raise
+
+            delay = retryDelay * (2 ** attempt) * random.uniform(0.5, 1.5)
+            print 'DB locked, retry in %.2f s' % delay
+            time.sleep(delay)
+
+
+def disconnect(path=None) : 
+    """ close shared connections of db path. close all connections if no path given. 
+        connections of other threads are dropped from the pool and closed once no longer used 
+    """
+    if path is None : 
+        paths = set([a[0] for a in _connections])
+
+    else : 
+        paths = [os.path.normpath(path)]
+
+        if replicaDir and paths[0] in _replicaState : 
+            paths.append(replicaPath(paths[0]))
+
+    ident = threading.current_thread().ident
+
+    for key in [a for a in _connections.keys() if a[0] in paths] : 
+        sql = _connections.pop(key)
+
+        if key[1] == ident : 
+            sql.rollback()
+            sql.close()
+
+    # cache was validated against these connections 
+    for each in paths : 
+        _readCache.pop(each, None)
+
+
+def disconnectThread() : 
+    """ close shared connections and db service socket of current thread, e.g. before the thread ends """
+    ident = threading.current_thread().ident
+
+    for key in [a for a in _connections.keys() if a[1] == ident] : 
+        sql = _connections.pop(key)
+        sql.rollback()
+        sql.close()
+
+    closeService()
+
+
+class transaction(object) : 
+    """ shared connection in one explicit write transaction. commit on success, rollback on error 
+
+        with db.transaction(path) as conn : 
+            db.addMatteIDValue(conn, ...)
+
+        path can also be an open connection. a transaction opened inside another one on 
+        the same connection joins the outer one, which commits or rolls back everything 
+
+        only for DML. python 2 sqlite3 commits the open transaction before any other 
+        statement, so DDL, PRAGMA, ANALYZE or VACUUM inside it end it early. run those 
+        with isolation_level None and a manual BEGIN IMMEDIATE / COMMIT like upgradeSchema 
+    """
+    def __init__(self, path) : 
+        self.path = path
+        self.sql = None
+        self.outer = False
+
+    def __enter__(self) : 
+        if isinstance(self.path, sqlite3.Connection) : 
+            self.sql = self.path
+
+        else : 
+            self.sql = connect(self.path)
+
+        key = id(self.sql)
+        self.outer = not _transactions.get(key)
+
+        if self.outer : 
+            # take write lock up front so statements below are not interleaved with other sessions 
+            retry(self.sql.execute, 'BEGIN IMMEDIATE')
+
+        _transactions[key] = _transactions.get(key, 0) + 1
+        return self.sql
+
+    def __exit__(self, excType, excValue, tb) : 
+        key = id(self.sql)
+        _transactions[key] -= 1
+
+        if not self.outer : 
+            return False
+
+        del _transactions[key]
+
+        if excType is None : 
+            try : 
+                retry(self.sql.commit)
+
+            except Exception : 
+                self.sql.rollback()
+                raise
+
+            # write is committed, replica is copied again on next read instead of here. 
+            # a failed copy must not turn the write into an error 
+            path = os.path.normpath(getattr(self.sql, 'path', ''))
+
+            if replicaDir and path in _replicaState : 
+                markReplicaStale(path)
+
+        else : 
+            self.sql.rollback()
+
+        return False
+
+
 def captureData(data) : 
     dbData = []
 
@@ -67,79 +770,1750 @@ def createTable(sql) :
             MultiMatte          TEXT,
             VrayMtl             TEXT);''')
 
+    sql.commit()
 
+    # new db goes through the same migrations as existing ones 
+    upgradeSchema(sql)
 
-def addObjectIDValue(sql, oID, AssetName, AssetPath, User, mID) : 
-    sql.execute('''INSERT INTO ObjectID (oID, AssetName, AssetPath, User, mID) VALUES(?,?,?,?,?)''', (oID, AssetName, AssetPath, User, mID))
 
-def addMatteIDValue(sql, mID, Color, MultiMatte, VrayMtl) : 
-    sql.execute('''INSERT INTO MatteID (mID, Color, MultiMatte, VrayMtl) VALUES(?,?,?,?)''', (mID, Color, MultiMatte, VrayMtl))
+# schema migration 
 
-def updateObjectIDValue(sql, ID, oID, assetName, assetPath, User, mID) : 
-    # sql.execute('''INSERT INTO ObjectID (oID, AssetName, AssetPath, User, mID) VALUES(?,?,?,?,?)''', (oID, AssetName, AssetPath, User, mID))
-    sql.execute('''UPDATE ObjectID SET oID = ? WHERE id = ? ''', (oID, ID))
-    sql.execute('''UPDATE ObjectID SET assetName = ? WHERE id = ? ''', (assetName, ID))
-    sql.execute('''UPDATE ObjectID SET assetPath = ? WHERE id = ? ''', (assetPath, ID))
-    sql.execute('''UPDATE ObjectID SET User = ? WHERE id = ? ''', (User, ID))
-    sql.execute('''UPDATE ObjectID SET mID = ? WHERE id = ? ''', (mID, ID))
+def getSchemaVersion(sql) : 
+    """ schema version of db. 0 if db was created before versioning """
+    sql.execute('''CREATE TABLE IF NOT EXISTS SchemaVersion
+            (Version            INTEGER PRIMARY KEY,
+            Date                TEXT);''')
 
+    result = sql.execute('SELECT MAX(Version) FROM SchemaVersion').fetchone()
+    return result[0] or 0
 
-def updateMatteIDValue(sql, ID, mID, Color, MultiMatte, VrayMtl) : 
-    # sql.execute('''INSERT INTO ObjectID (oID, AssetName, AssetPath, User, mID) VALUES(?,?,?,?,?)''', (oID, AssetName, AssetPath, User, mID))
-    sql.execute('''UPDATE MatteID SET mID = ? WHERE id = ? ''', (mID, ID))
-    sql.execute('''UPDATE MatteID SET Color = ? WHERE id = ? ''', (Color, ID))
-    sql.execute('''UPDATE MatteID SET MultiMatte = ? WHERE id = ? ''', (MultiMatte, ID))
-    sql.execute('''UPDATE MatteID SET VrayMtl = ? WHERE id = ? ''', (VrayMtl, ID))
 
+def upgradeSchema(sql) : 
+    """ run migrations newer than schema version of db. then fit search index to this session, see checkSearchIndex """
+    if getSchemaVersion(sql) >= schemaVersion : 
+        checkSearchIndex(sql)
+        return False
 
-def queryObjectIDTable(sql) : 
-    result = sql.execute('SELECT * FROM ObjectID')
-    return result
+    # manual transaction so ddl statements are not committed one by one 
+    isolationLevel = sql.isolation_level
+    sql.isolation_level = None
 
-def getObjectID(sql, oID) : 
-    result = sql.execute('SELECT * FROM ObjectID WHERE oID = %s' % oID)
-    return result 
+    try : 
+        sql.execute('BEGIN IMMEDIATE')
 
-def getAssetName(sql, assetName) : 
-    result = sql.execute('SELECT * FROM ObjectID WHERE AssetName = "%s"' % assetName)
-    return result 
+        try : 
+            # read again inside the lock, another session may have upgraded already 
+            version = getSchemaVersion(sql)
 
-def getRecordFromPath(sql, path) : 
-    result = sql.execute('SELECT * FROM ObjectID WHERE AssetPath = "%s"' % path)
-    return result 
+            for eachVersion, migration in migrations : 
+                if eachVersion > version : 
+                    migration(sql)
+                    sql.execute("INSERT INTO SchemaVersion (Version, Date) VALUES (?, datetime('now'))", (eachVersion, ))
+                    print 'Upgrade db schema to v.%s' % eachVersion
 
-def getMatteID(sql, mID) : 
-    result = sql.execute('SELECT * FROM MatteID WHERE mID = %s' % mID)
-    return result 
+            sql.execute('COMMIT')
 
-def deleteMatteID(sql, mIDs) : 
-    for mID in mIDs : 
-        sql.execute('DELETE FROM matteID WHERE mID=%s' % mID)
-    return True
+        except Exception : 
+            sql.execute('ROLLBACK')
+            raise
+
+    finally : 
+        sql.isolation_level = isolationLevel
 
-def deleteObjectID(sql, oIDs) : 
-    for oID in oIDs : 
-        sql.execute('DELETE FROM objectID WHERE oID=%s' % oID)
     return True
 
-def getAllMID(sql) : 
-    result = sql.execute('SELECT mID FROM MatteID')
-    return result
 
-def getAllOID(sql) : 
-    result = sql.execute('SELECT oID FROM ObjectID')
-    return result
+def removeDuplicates(sql, table, column) : 
+    """ keep first record of each value of column. move others to <table>Duplicate """
+    duplicates = '''SELECT ID FROM %s WHERE %s IS NOT NULL AND ID NOT IN 
+            (SELECT MIN(ID) FROM %s WHERE %s IS NOT NULL GROUP BY %s)''' % (table, column, table, column, column)
 
+    sql.execute('CREATE TABLE IF NOT EXISTS %sDuplicate AS SELECT * FROM %s WHERE 0' % (table, table))
+    sql.execute('INSERT INTO %sDuplicate SELECT * FROM %s WHERE ID IN (%s)' % (table, table, duplicates))
+    result = sql.execute('DELETE FROM %s WHERE ID IN (%s)' % (table, duplicates))
 
+    if result.rowcount : 
+        print 'Move %s duplicated %s records to %sDuplicate' % (result.rowcount, column, table)
 
-# conn.execute("INSERT INTO COMPANY (ID,NAME,AGE,ADDRESS,SALARY) \
-#       VALUES (1, 'Paul', 32, 'California', 20000.00 )");
+    return result.rowcount
 
-# conn.execute("INSERT INTO COMPANY (ID,NAME,AGE,ADDRESS,SALARY) \
-#       VALUES (2, 'Allen', 25, 'Texas', 15000.00 )");
 
-# conn.execute("INSERT INTO COMPANY (ID,NAME,AGE,ADDRESS,SALARY) \
-#       VALUES (3, 'Teddy', 23, 'Norway', 20000.00 )");
+def migrateV1(sql) : 
+    """ index lookup columns. oID, AssetName and mID are unique """
+    removeDuplicates(sql, 'ObjectID', 'oID')
+    removeDuplicates(sql, 'ObjectID', 'AssetName')
+    removeDuplicates(sql, 'MatteID', 'mID')
 
-# conn.execute("INSERT INTO COMPANY (ID,NAME,AGE,ADDRESS,SALARY) \
-#       VALUES (4, 'Mark', 25, 'Rich-Mond ', 65000.00 )");
\ No newline at end of file
+    sql.execute('CREATE UNIQUE INDEX IF NOT EXISTS ObjectID_oID ON ObjectID (oID)')
+    sql.execute('CREATE UNIQUE INDEX IF NOT EXISTS ObjectID_AssetName ON ObjectID (AssetName)')
+    sql.execute('CREATE INDEX IF NOT EXISTS ObjectID_AssetPath ON ObjectID (AssetPath)')
+    sql.execute('CREATE UNIQUE INDEX IF NOT EXISTS MatteID_mID ON MatteID (mID)')
+
+
+def migrateV2(sql) : 
+    """ ObjectMatte junction table, filled from ObjectID.mID lists """
+    sql.execute('''CREATE TABLE IF NOT EXISTS ObjectMatte
+            (oID                INTEGER NOT NULL,
+            mID                 INTEGER NOT NULL,
+            PRIMARY KEY (oID, mID));''')
+    sql.execute('CREATE INDEX IF NOT EXISTS ObjectMatte_mID ON ObjectMatte (mID)')
+
+    for oID, mIDs in sql.execute('SELECT oID, mID FROM ObjectID WHERE oID IS NOT NULL').fetchall() : 
+        setObjectMattes(sql, oID, mIDs)
+
+
+def migrateV3(sql) : 
+    """ free range index. free oID slots of each registered lattice as blocks, kept by triggers """
+    sql.execute('''CREATE TABLE IF NOT EXISTS FreeRange
+            (ID                 INTEGER PRIMARY KEY AUTOINCREMENT,
+            RangeStart          INTEGER NOT NULL,
+            RangeEnd            INTEGER NOT NULL,
+            Step                INTEGER NOT NULL,
+            Free                INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (RangeStart, RangeEnd, Step));''')
+    sql.execute('''CREATE TABLE IF NOT EXISTS FreeBlock
+            (RangeID            INTEGER NOT NULL,
+            Start               INTEGER NOT NULL,
+            Size                INTEGER NOT NULL,
+            PRIMARY KEY (RangeID, Start));''')
+    sql.execute('CREATE INDEX IF NOT EXISTS FreeBlock_Size ON FreeBlock (RangeID, Size)')
+
+    useSlot = ';\n'.join(useSlotSql('NEW.oID'))
+    freeSlot = ';\n'.join(freeSlotSql('OLD.oID'))
+
+    sql.execute('CREATE TRIGGER IF NOT EXISTS ObjectID_UseSlot AFTER INSERT ON ObjectID WHEN NEW.oID IS NOT NULL BEGIN\n%s;\nEND' % useSlot)
+    sql.execute('CREATE TRIGGER IF NOT EXISTS ObjectID_FreeSlot AFTER DELETE ON ObjectID WHEN OLD.oID IS NOT NULL BEGIN\n%s;\nEND' % freeSlot)
+    sql.execute('CREATE TRIGGER IF NOT EXISTS ObjectID_MoveSlot AFTER UPDATE OF oID ON ObjectID WHEN OLD.oID IS NOT NEW.oID BEGIN\n%s;\n%s;\nEND' % (freeSlot, useSlot))
+
+    for idStart, idRange, idStep in idRanges : 
+        addIDRange(sql, idStart, idRange, idStep)
+
+
+def migrateV4(sql) : 
+    """ MaterialMatte index of material names, filled from MatteID.VrayMtl lists of each object """
+    sql.execute('''CREATE TABLE IF NOT EXISTS MaterialMatte
+            (Material           TEXT NOT NULL,
+            mID                 INTEGER NOT NULL,
+            oID                 INTEGER NOT NULL,
+            PRIMARY KEY (Material, mID, oID));''')
+    sql.execute('CREATE INDEX IF NOT EXISTS MaterialMatte_mID ON MaterialMatte (mID)')
+    sql.execute('CREATE INDEX IF NOT EXISTS MaterialMatte_oID ON MaterialMatte (oID)')
+
+    rebuildMaterialMattes(sql)
+
+
+def migrateV5(sql) : 
+    """ AssetSearch full text index of ObjectID AssetName, AssetPath and User, kept by triggers. 
+        skipped if sqlite has no FTS4, searchAssets then scans ObjectID with LIKE 
+    """
+    if not hasFullText(sql) : 
+        print 'sqlite %s has no FTS4, asset search uses LIKE' % sqlite3.sqlite_version
+        return 
+
+    # short prefixes indexed, the first letters typed in the viewer do not merge every matching word 
+    sql.execute('CREATE VIRTUAL TABLE IF NOT EXISTS AssetSearch USING fts4(AssetName, AssetPath, User, prefix="1,2,3")')
+
+    createSearchTriggers(sql)
+    rebuildSearchIndex(sql)
+
+
+# triggers keeping AssetSearch in sync. a session without FTS4 drops them, see checkSearchIndex 
+searchTriggers = ['ObjectID_SearchAdd', 'ObjectID_SearchDelete', 'ObjectID_SearchUpdate']
+
+
+def createSearchTriggers(sql) : 
+    # docid is ObjectID.ID. insert also clears docid, rows replaced without recursive triggers leave it behind 
+    sql.execute('''CREATE TRIGGER IF NOT EXISTS ObjectID_SearchAdd AFTER INSERT ON ObjectID BEGIN
+            DELETE FROM AssetSearch WHERE docid = NEW.ID;
+            INSERT INTO AssetSearch (docid, AssetName, AssetPath, User) VALUES (NEW.ID, NEW.AssetName, NEW.AssetPath, NEW.User);
+            END''')
+    sql.execute('''CREATE TRIGGER IF NOT EXISTS ObjectID_SearchDelete AFTER DELETE ON ObjectID BEGIN
+            DELETE FROM AssetSearch WHERE docid = OLD.ID;
+            END''')
+    sql.execute('''CREATE TRIGGER IF NOT EXISTS ObjectID_SearchUpdate AFTER UPDATE OF AssetName, AssetPath, User ON ObjectID BEGIN
+            UPDATE AssetSearch SET AssetName = NEW.AssetName, AssetPath = NEW.AssetPath, User = NEW.User WHERE docid = NEW.ID;
+            END''')
+
+
+def checkSearchIndex(sql) : 
+    """ fit AssetSearch to the sqlite of this session. without FTS4 its triggers fail every ObjectID write, 
+        so they are dropped and search uses LIKE. a session with FTS4 creates them again and rebuilds the index 
+    """
+    # manual transaction so ddl statements are not committed one by one 
+    isolationLevel = sql.isolation_level
+    sql.isolation_level = None
+
+    try : 
+        if not sql.execute("SELECT 1 FROM sqlite_master WHERE name = 'AssetSearch'").fetchone() : 
+            return 
+
+        fullText = hasFullText(sql)
+        triggers = sql.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (?,?,?)", searchTriggers).fetchall()
+
+        if len(triggers) == (len(searchTriggers) if fullText else 0) : 
+            return 
+
+        retry(sql.execute, 'BEGIN IMMEDIATE')
+
+        try : 
+            # read again inside the lock, another session may have fixed it already 
+            for (name, ) in sql.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (?,?,?)", searchTriggers).fetchall() : 
+                sql.execute('DROP TRIGGER %s' % name)
+
+            if fullText : 
+                createSearchTriggers(sql)
+                rebuildSearchIndex(sql)
+                print 'Search index rebuilt'
+
+            else : 
+                print 'sqlite %s has no FTS4, search index is not kept and asset search uses LIKE' % sqlite3.sqlite_version
+
+            sql.execute('COMMIT')
+
+        except Exception : 
+            sql.execute('ROLLBACK')
+            raise
+
+    finally : 
+        sql.isolation_level = isolationLevel
+
+
+def rebuildSearchIndex(sql) : 
+    """ fill AssetSearch from ObjectID, e.g. after a load with its triggers dropped. nothing to do without the index """
+    if not query(sql, 'hasSearchIndex').fetchone() : 
+        return 
+
+    sql.execute('DELETE FROM AssetSearch')
+    sql.execute('INSERT INTO AssetSearch (docid, AssetName, AssetPath, User) SELECT ID, AssetName, AssetPath, User FROM ObjectID')
+
+
+# FTS4 support of this session, probed on first use 
+_fullText = None
+
+
+def hasFullText(sql) : 
+    """ True if sqlite of this session can create FTS4 tables. compile_options do not tell for every build, 
+        so a temp table is tried once 
+    """
+    global _fullText
+
+    if _fullText is None : 
+        try : 
+            sql.execute('CREATE VIRTUAL TABLE temp.FullTextProbe USING fts4(Probe)')
+
+        except sqlite3.OperationalError : 
+            _fullText = False
+
+        else : 
+            sql.execute('DROP TABLE temp.FullTextProbe')
+            _fullText = True
+
+    return _fullText
+
+
+# triggers of free range index. {oID} is NEW.oID or OLD.oID. a block of range R is free slots 
+# Start, Start + Step, ... Start + (Size - 1) * Step. the block holding a slot is the one with 
+# greatest Start not above it. blocks are picked by rowid so every lookup stays on the (RangeID, Start) key 
+slotRanges = 'SELECT ID FROM FreeRange WHERE {oID} >= RangeStart AND {oID} < RangeEnd AND ({oID} - RangeStart) % Step = 0'
+lastBlock = '(SELECT MAX(m.Start) FROM FreeBlock m WHERE m.RangeID = r.ID AND m.Start %s {oID})'
+holdingBlock = '''SELECT b.rowid FROM FreeRange r JOIN FreeBlock b ON b.RangeID = r.ID 
+        WHERE r.ID IN (%s) AND b.Start = %s AND {oID} < b.Start + b.Size * r.Step''' % (slotRanges, lastBlock % '<=')
+rangeStep = '(SELECT r.Step FROM FreeRange r WHERE r.ID = FreeBlock.RangeID)'
+
+
+def useSlotSql(oID) : 
+    """ statements that take slot oID out of its free blocks """
+    statements = [
+        # free counter, only if slot was free 
+        'UPDATE FreeRange SET Free = Free - 1 WHERE ID IN (SELECT RangeID FROM FreeBlock WHERE rowid IN (%s))' % holdingBlock, 
+        # slots after oID become a new block 
+        '''INSERT INTO FreeBlock (RangeID, Start, Size) 
+            SELECT b.RangeID, {oID} + r.Step, b.Size - ({oID} - b.Start) / r.Step - 1 FROM FreeRange r JOIN FreeBlock b ON b.RangeID = r.ID 
+            WHERE b.rowid IN (%s) AND b.Size - ({oID} - b.Start) / r.Step - 1 > 0''' % holdingBlock, 
+        # holding block keeps the slots before oID, empty if oID was its first slot 
+        'UPDATE FreeBlock SET Size = ({oID} - Start) / %s WHERE rowid IN (%s)' % (rangeStep, holdingBlock), 
+        'DELETE FROM FreeBlock WHERE RangeID IN (%s) AND Start = {oID} AND Size = 0' % slotRanges]
+
+    return [a.replace('{oID}', oID) for a in statements]
+
+
+def freeSlotSql(oID) : 
+    """ statements that put slot oID back as free, merged with the blocks next to it """
+    newRanges = '''SELECT r.ID FROM FreeRange r WHERE r.ID IN (%s) AND NOT EXISTS 
+            (SELECT 1 FROM FreeBlock b WHERE b.RangeID = r.ID AND b.Start = %s AND {oID} < b.Start + b.Size * r.Step)''' % (slotRanges, lastBlock % '<=')
+    statements = [
+        'UPDATE FreeRange SET Free = Free + 1 WHERE ID IN (%s)' % newRanges, 
+        'INSERT INTO FreeBlock (RangeID, Start, Size) SELECT ID, {oID}, 1 FROM FreeRange WHERE ID IN (%s)' % newRanges, 
+        # merge block right after 
+        '''UPDATE FreeBlock SET Size = Size + (SELECT n.Size FROM FreeBlock n WHERE n.RangeID = FreeBlock.RangeID AND n.Start = {oID} + %s) 
+            WHERE rowid IN (SELECT b.rowid FROM FreeRange r JOIN FreeBlock b ON b.RangeID = r.ID AND b.Start = {oID} 
+            WHERE r.ID IN (%s) AND b.Size = 1 AND EXISTS (SELECT 1 FROM FreeBlock n WHERE n.RangeID = r.ID AND n.Start = {oID} + r.Step))''' % (rangeStep, slotRanges), 
+        '''DELETE FROM FreeBlock WHERE rowid IN (SELECT b.rowid FROM FreeRange r JOIN FreeBlock b ON b.RangeID = r.ID AND b.Start = {oID} + r.Step 
+            WHERE r.ID IN (%s) AND EXISTS (SELECT 1 FROM FreeBlock p WHERE p.RangeID = r.ID AND p.Start = {oID} AND p.Start + p.Size * r.Step > b.Start))''' % slotRanges, 
+        # merge into block right before 
+        '''UPDATE FreeBlock SET Size = Size + (SELECT n.Size FROM FreeBlock n WHERE n.RangeID = FreeBlock.RangeID AND n.Start = {oID}) 
+            WHERE rowid IN (SELECT b.rowid FROM FreeRange r JOIN FreeBlock b ON b.RangeID = r.ID AND b.Start = %s 
+            WHERE r.ID IN (%s) AND b.Start + b.Size * r.Step = {oID} AND EXISTS (SELECT 1 FROM FreeBlock n WHERE n.RangeID = r.ID AND n.Start = {oID}))''' % (lastBlock % '<', slotRanges), 
+        '''DELETE FROM FreeBlock WHERE rowid IN (SELECT b.rowid FROM FreeRange r JOIN FreeBlock b ON b.RangeID = r.ID AND b.Start = {oID} 
+            WHERE r.ID IN (%s) AND EXISTS (SELECT 1 FROM FreeBlock p WHERE p.RangeID = r.ID AND p.Start = %s AND p.Start + p.Size * r.Step > {oID}))''' % (slotRanges, lastBlock % '<')]
+
+    return [a.replace('{oID}', oID) for a in statements]
+
+
+# (version, migration) in order. schemaVersion follows the last one 
+migrations = [(1, migrateV1), (2, migrateV2), (3, migrateV3), (4, migrateV4), (5, migrateV5)]
+schemaVersion = migrations[-1][0]
+
+
+
+# query registry. every accessor runs one of these with bound parameters, so the sql text 
+# stays the same between calls and sqlite reuses the prepared statement of the connection 
+queries = {
+    'queryObjectIDTable': 'SELECT * FROM ObjectID', 
+    'getObjectID': 'SELECT * FROM ObjectID WHERE oID = ?', 
+    'getAssetName': 'SELECT * FROM ObjectID WHERE AssetName = ?', 
+    'getRecordFromPath': 'SELECT * FROM ObjectID WHERE AssetPath = ?', 
+    'getMatteID': 'SELECT * FROM MatteID WHERE mID = ?', 
+    'getAllMID': 'SELECT mID FROM MatteID', 
+    'getAllOID': 'SELECT oID FROM ObjectID', 
+    'addObjectID': 'INSERT INTO ObjectID (oID, AssetName, AssetPath, User, mID) VALUES(?,?,?,?,?)', 
+    'addMatteID': 'INSERT INTO MatteID (mID, Color, MultiMatte, VrayMtl) VALUES(?,?,?,?)', 
+    'updateObjectID': 'UPDATE ObjectID SET oID = ?, AssetName = ?, AssetPath = ?, User = ?, mID = ? WHERE ID = ?', 
+    'updateMatteID': 'UPDATE MatteID SET mID = ?, Color = ?, MultiMatte = ?, VrayMtl = ? WHERE ID = ?', 
+    'upsertObjectID': '''INSERT OR REPLACE INTO ObjectID (ID, oID, AssetName, AssetPath, User, mID) 
+            VALUES((SELECT ID FROM ObjectID WHERE oID = ?),?,?,?,?,?)''', 
+    'upsertMatteID': '''INSERT OR REPLACE INTO MatteID (ID, mID, Color, MultiMatte, VrayMtl) 
+            VALUES((SELECT ID FROM MatteID WHERE mID = ?),?,?,?,?)''', 
+    'getObjectOfAsset': 'SELECT oID FROM ObjectID WHERE AssetName = ?', 
+    'scanFreeObjectID': '''SELECT MIN(slot) FROM 
+            (SELECT ? AS slot UNION ALL 
+            SELECT oID + ? FROM ObjectID WHERE oID >= ? AND oID < ? AND (oID - ?) % ? = 0) 
+            WHERE slot < ? AND NOT EXISTS (SELECT 1 FROM ObjectID WHERE oID = slot)''', 
+    'getIDRange': 'SELECT ID FROM FreeRange WHERE RangeStart = ? AND RangeEnd = ? AND Step = ?', 
+    'addIDRange': 'INSERT INTO FreeRange (RangeStart, RangeEnd, Step) VALUES(?,?,?)', 
+    'getUsedSlots': 'SELECT oID FROM ObjectID WHERE oID >= ? AND oID < ? AND (oID - ?) % ? = 0 ORDER BY oID', 
+    'firstFreeBlock': 'SELECT MIN(Start) FROM FreeBlock WHERE RangeID = ?', 
+    'getFreeBlocks': 'SELECT Start, Size FROM FreeBlock WHERE RangeID = ? ORDER BY Start', 
+    'largestFreeBlock': 'SELECT Start, Size FROM FreeBlock WHERE RangeID = ? ORDER BY Size DESC, Start LIMIT 1', 
+    'getFreeCount': 'SELECT Free FROM FreeRange WHERE ID = ?', 
+    'addObjectMatte': 'INSERT INTO ObjectMatte (oID, mID) VALUES(?,?)', 
+    'deleteObjectMatte': 'DELETE FROM ObjectMatte WHERE oID = ?', 
+    'deleteObjectMatteOfRecord': 'DELETE FROM ObjectMatte WHERE oID = (SELECT oID FROM ObjectID WHERE ID = ?)', 
+    'getObjectMatteIDs': 'SELECT mID FROM ObjectMatte WHERE oID = ? ORDER BY mID', 
+    'getObjectMattes': '''SELECT MatteID.* FROM ObjectMatte 
+            JOIN MatteID ON MatteID.mID = ObjectMatte.mID 
+            WHERE ObjectMatte.oID = ? ORDER BY MatteID.mID''', 
+    'addMaterialMatte': 'INSERT OR IGNORE INTO MaterialMatte (Material, mID, oID) VALUES(?,?,?)', 
+    'deleteMaterialMatte': 'DELETE FROM MaterialMatte WHERE oID = ?', 
+    'deleteMaterialMatteOfMatte': 'DELETE FROM MaterialMatte WHERE mID = ?', 
+    'deleteMaterialMatteOfRecord': 'DELETE FROM MaterialMatte WHERE oID = (SELECT oID FROM ObjectID WHERE ID = ?)', 
+    'deleteMaterialMatteOfMatteRecord': 'DELETE FROM MaterialMatte WHERE mID = (SELECT mID FROM MatteID WHERE ID = ?)', 
+    'getObjectMaterials': '''SELECT ObjectMatte.oID, MatteID.mID, MatteID.VrayMtl FROM ObjectMatte 
+            JOIN MatteID ON MatteID.mID = ObjectMatte.mID WHERE ObjectMatte.oID = ?''', 
+    'getMatteMaterials': '''SELECT ObjectMatte.oID, MatteID.mID, MatteID.VrayMtl FROM ObjectMatte 
+            JOIN MatteID ON MatteID.mID = ObjectMatte.mID WHERE ObjectMatte.mID = ?''', 
+    'getMaterialMattes': 'SELECT Material, mID FROM MaterialMatte WHERE oID = ? ORDER BY mID, Material', 
+    'getMattesOfMaterial': 'SELECT mID, oID FROM MaterialMatte WHERE Material = ? ORDER BY mID, oID', 
+    'getMaterialsOfMatte': 'SELECT Material, oID FROM MaterialMatte WHERE mID = ? ORDER BY Material, oID', 
+    'hasSearchIndex': "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'ObjectID_SearchAdd'", 
+    'searchAssets': '''SELECT ObjectID.* FROM AssetSearch 
+            JOIN ObjectID ON ObjectID.ID = AssetSearch.docid 
+            WHERE AssetSearch MATCH ? ORDER BY AssetSearch.docid LIMIT ?''', 
+    }
+
+# oID and mID are unique (migrateV1). sqlite 3.24 updates the conflicting record in place, 
+# a record of oID only if it is the same asset. older sqlite replaces it with the statements 
+# above, which delete and insert it again and run the triggers of both 
+hasUpsert = sqlite3.sqlite_version_info >= (3, 24, 0)
+
+if hasUpsert : 
+    queries.update({
+        'upsertObjectID': '''INSERT INTO ObjectID (oID, AssetName, AssetPath, User, mID) VALUES(?,?,?,?,?) 
+                ON CONFLICT (oID) DO UPDATE SET AssetPath = excluded.AssetPath, User = excluded.User, 
+                mID = excluded.mID WHERE ObjectID.AssetName = excluded.AssetName''', 
+        'upsertMatteID': '''INSERT INTO MatteID (mID, Color, MultiMatte, VrayMtl) VALUES(?,?,?,?) 
+                ON CONFLICT (mID) DO UPDATE SET Color = excluded.Color, MultiMatte = excluded.MultiMatte, 
+                VrayMtl = excluded.VrayMtl''', 
+        })
+
+# prepared statements kept per connection, enough for all registered queries and IN list sizes 
+statementCacheSize = 256
+
+
+def query(sql, name, params=()) : 
+    """ run registered query with bound parameters """
+    return sql.execute(queries[name], params)
+
+
+def queryMany(sql, name, rows) : 
+    """ run registered query once per row of parameters """
+    return sql.executemany(queries[name], rows)
+
+
+def parseList(value) : 
+    """ list stored as text in ObjectID.mID and MatteID.VrayMtl. literal only, no code is run """
+    if not value : 
+        return []
+
+    if isinstance(value, (list, tuple)) : 
+        return list(value)
+
+    try : 
+        result = ast.literal_eval(value)
+
+    except (ValueError, SyntaxError) : 
+        print 'Cannot read list %s' % value
+        return []
+
+    if isinstance(result, (list, tuple)) : 
+        return list(result)
+
+    return [result]
+
+
+def setObjectMattes(sql, oID, mIDs) : 
+    """ replace ObjectMatte rows of oID. mIDs is a list or its text from ObjectID.mID """
+    mIDs = set([int(a) for a in parseList(mIDs)])
+    query(sql, 'deleteObjectMatte', (oID, ))
+    queryMany(sql, 'addObjectMatte', [(oID, a) for a in sorted(mIDs)])
+
+
+def setMaterialMattes(sql, oID, matteRecords) : 
+    """ replace MaterialMatte rows of oID. matteRecords are (mID, Color, MultiMatte, VrayMtl) like upsertMatteIDs """
+    rows = []
+
+    for record in matteRecords : 
+        for material in parseList(record[3]) : 
+            rows.append((str(material), int(record[0]), oID))
+
+    query(sql, 'deleteMaterialMatte', (oID, ))
+    queryMany(sql, 'addMaterialMatte', rows)
+
+
+def materialRows(records) : 
+    """ MaterialMatte rows (Material, mID, oID) of (oID, mID, VrayMtl) records of ObjectMatte joined with MatteID """
+    rows = []
+
+    for oID, mID, vrayMtl in records : 
+        for material in parseList(vrayMtl) : 
+            rows.append((str(material), mID, oID))
+
+    return rows
+
+
+def rebuildMaterialMattes(sql) : 
+    """ fill MaterialMatte from ObjectMatte and MatteID.VrayMtl. a shared mID lists its materials under each object """
+    rows = materialRows(sql.execute('''SELECT ObjectMatte.oID, MatteID.mID, MatteID.VrayMtl FROM ObjectMatte 
+            JOIN MatteID ON MatteID.mID = ObjectMatte.mID''').fetchall())
+
+    sql.execute('DELETE FROM MaterialMatte')
+    queryMany(sql, 'addMaterialMatte', rows)
+
+
+def syncObjectMaterials(sql, oID) : 
+    """ MaterialMatte rows of oID again from ObjectMatte and MatteID.VrayMtl, like rebuildMaterialMattes """
+    query(sql, 'deleteMaterialMatte', (oID, ))
+    queryMany(sql, 'addMaterialMatte', materialRows(query(sql, 'getObjectMaterials', (oID, )).fetchall()))
+
+
+def syncMatteMaterials(sql, mID) : 
+    """ MaterialMatte rows of mID under every object listing it, like rebuildMaterialMattes """
+    query(sql, 'deleteMaterialMatteOfMatte', (mID, ))
+    queryMany(sql, 'addMaterialMatte', materialRows(query(sql, 'getMatteMaterials', (mID, )).fetchall()))
+
+
+# record writers of the older export apps. ObjectMatte and MaterialMatte follow each write, 
+# matte records find their object through ObjectMatte 
+def addObjectIDValue(sql, oID, AssetName, AssetPath, User, mID) : 
+    query(sql, 'addObjectID', (oID, AssetName, AssetPath, User, mID))
+    setObjectMattes(sql, oID, mID)
+    syncObjectMaterials(sql, oID)
+
+def addMatteIDValue(sql, mID, Color, MultiMatte, VrayMtl) : 
+    query(sql, 'addMatteID', (mID, Color, MultiMatte, VrayMtl))
+    syncMatteMaterials(sql, mID)
+
+def updateObjectIDValue(sql, ID, oID, assetName, assetPath, User, mID) : 
+    query(sql, 'deleteObjectMatteOfRecord', (ID, ))
+    query(sql, 'deleteMaterialMatteOfRecord', (ID, ))
+    query(sql, 'updateObjectID', (oID, assetName, assetPath, User, mID, ID))
+    setObjectMattes(sql, oID, mID)
+    syncObjectMaterials(sql, oID)
+
+
+def updateMatteIDValue(sql, ID, mID, Color, MultiMatte, VrayMtl) : 
+    query(sql, 'deleteMaterialMatteOfMatteRecord', (ID, ))
+    query(sql, 'updateMatteID', (mID, Color, MultiMatte, VrayMtl, ID))
+    syncMatteMaterials(sql, mID)
+
+
+# object ID allocation 
+
+# oID lattices (start, stop, step). each object books oID and uses oID + 1 .. oID + step - 1 as mIDs 
+charIDRange = (1000, 20000, 20)
+propIDRange = (100000, 110000, 10)
+
+
+# lattices indexed in FreeRange when db is created or upgraded. others are added on first allocation 
+idRanges = [charIDRange, propIDRange]
+
+
+def addIDRange(sql, idStart, idRange, idStep) : 
+    """ index free slots of lattice from ObjectID. return its FreeRange ID. caller holds the write lock """
+    record = query(sql, 'getIDRange', (idStart, idRange, idStep)).fetchone()
+
+    if record : 
+        return record[0]
+
+    rangeID = query(sql, 'addIDRange', (idStart, idRange, idStep)).lastrowid
+    buildFreeBlocks(sql, rangeID, idStart, idRange, idStep)
+
+    return rangeID
+
+
+def buildFreeBlocks(sql, rangeID, idStart, idRange, idStep) : 
+    """ replace free blocks of range with the gaps between used oIDs """
+    blocks = []
+    slot = idStart
+
+    for (oID, ) in query(sql, 'getUsedSlots', (idStart, idRange, idStart, idStep)).fetchall() : 
+        if oID > slot : 
+            blocks.append((rangeID, slot, (oID - slot) / idStep))
+
+        slot = oID + idStep
+
+    if slot < idRange : 
+        blocks.append((rangeID, slot, (idRange - slot + idStep - 1) / idStep))
+
+    sql.execute('DELETE FROM FreeBlock WHERE RangeID = ?', (rangeID, ))
+    sql.executemany('INSERT INTO FreeBlock (RangeID, Start, Size) VALUES(?,?,?)', blocks)
+    sql.execute('UPDATE FreeRange SET Free = ? WHERE ID = ?', (sum([a[2] for a in blocks]), rangeID))
+
+
+def rebuildFreeRanges(sql) : 
+    """ rebuild free blocks of every lattice, e.g. after writes of a client without the triggers """
+    for rangeID, idStart, idRange, idStep in sql.execute('SELECT ID, RangeStart, RangeEnd, Step FROM FreeRange').fetchall() : 
+        buildFreeBlocks(sql, rangeID, idStart, idRange, idStep)
+
+
+def getIDRange(sql, idStart, idRange, idStep) : 
+    """ FreeRange ID of lattice, None if it is not indexed """
+    record = query(sql, 'getIDRange', (idStart, idRange, idStep)).fetchone()
+
+    if record : 
+        return record[0]
+
+
+def registerIDRange(sql, idStart, idRange, idStep) : 
+    """ FreeRange ID of lattice, indexed in its own transaction if not yet """
+    rangeID = getIDRange(sql, idStart, idRange, idStep)
+
+    if rangeID is None : 
+        with transaction(sql) : 
+            rangeID = addIDRange(sql, idStart, idRange, idStep)
+
+    return rangeID
+
+
+def findFreeObjectID(sql, idStart, idRange, idStep) : 
+    """ first oID of lattice not in ObjectID, None if lattice is full. 
+        read from free range index, lattice not indexed yet is scanned 
+    """
+    rangeID = getIDRange(sql, idStart, idRange, idStep)
+
+    if rangeID is None : 
+        return query(sql, 'scanFreeObjectID', (idStart, idStep, idStart, idRange, idStart, idStep, idRange)).fetchone()[0]
+
+    return query(sql, 'firstFreeBlock', (rangeID, )).fetchone()[0]
+
+
+def freeObjectIDs(sql, idStart, idRange, idStep, count) : 
+    """ first count free oIDs of lattice, fewer if lattice has not enough """
+    rangeID = registerIDRange(sql, idStart, idRange, idStep)
+    result = []
+
+    for start, size in query(sql, 'getFreeBlocks', (rangeID, )) : 
+        result.extend(range(start, start + min(size, count - len(result)) * idStep, idStep))
+
+        if len(result) >= count : 
+            break
+
+    return result
+
+
+def idRangeUsage(sql, idStart, idRange, idStep) : 
+    """ {'slots', 'used', 'free', 'utilization'} of lattice, utilization in percent """
+    rangeID = registerIDRange(sql, idStart, idRange, idStep)
+    slots = max(0, (idRange - idStart + idStep - 1) / idStep)
+    free = query(sql, 'getFreeCount', (rangeID, )).fetchone()[0]
+    utilization = 100.0 * (slots - free) / slots if slots else 0.0
+
+    return {'slots': slots, 'used': slots - free, 'free': free, 'utilization': utilization}
+
+
+def largestFreeBlock(sql, idStart, idRange, idStep) : 
+    """ (first oID, number of slots) of largest run of free oIDs in lattice, None if lattice is full """
+    rangeID = registerIDRange(sql, idStart, idRange, idStep)
+    return query(sql, 'largestFreeBlock', (rangeID, )).fetchone()
+
+
+def allocateObjectID(path, assetName, assetPath, User, idStart, idRange, idStep) : 
+    """ book first free oID for asset under write lock, so two sessions never get the same oID. 
+        asset already in db keeps its oID. return None if lattice is full 
+    """
+    with transaction(path) as sql : 
+        record = query(sql, 'getObjectOfAsset', (assetName, )).fetchone()
+
+        if record : 
+            return record[0]
+
+        addIDRange(sql, idStart, idRange, idStep)
+        oID = findFreeObjectID(sql, idStart, idRange, idStep)
+
+        if oID is not None : 
+            addObjectIDValue(sql, oID, assetName, assetPath, User, '[]')
+
+        return oID
+
+
+# bulk export 
+
+def upsertObjectID(sql, oID, assetName, assetPath, User, mIDs) : 
+    """ add or update ObjectID record of oID in one statement. existing record keeps its ID. 
+        raise IntegrityError if oID belongs to another asset or asset is booked as another oID 
+    """
+    mIDs = sorted(set([int(a) for a in parseList(mIDs)]))
+    params = (oID, assetName, assetPath, User, str(mIDs))
+
+    if not hasUpsert : 
+        # replace would drop the record holding oID or asset name, check both first 
+        record = getObjectID(sql, oID).fetchone()
+
+        if record and not record[2] == assetName : 
+            raise sqlite3.IntegrityError('oID %s is used by %s' % (oID, record[2]))
+
+        record = getAssetName(sql, assetName).fetchone()
+
+        if record and not record[1] == oID : 
+            raise sqlite3.IntegrityError('%s is booked as oID %s' % (assetName, record[1]))
+
+        # replace statement looks up ID of existing record by oID first 
+        params = (oID, ) + params
+
+    # no row changed if record of oID is another asset 
+    if not query(sql, 'upsertObjectID', params).rowcount : 
+        raise sqlite3.IntegrityError('oID %s is used by %s' % (oID, getObjectID(sql, oID).fetchone()[2]))
+
+    setObjectMattes(sql, oID, mIDs)
+
+
+def upsertMatteIDs(sql, records) : 
+    """ add or update MatteID records [(mID, Color, MultiMatte, VrayMtl), ...] with one executemany """
+    rows = []
+
+    for mID, color, multiMatte, vrayMtl in records : 
+        if isinstance(vrayMtl, (list, tuple)) : 
+            vrayMtl = str(list(vrayMtl))
+
+        row = (int(mID), color, multiMatte, vrayMtl)
+        rows.append(row if hasUpsert else (int(mID), ) + row)
+
+    queryMany(sql, 'upsertMatteID', rows)
+
+    return len(rows)
+
+
+def queryObjectIDTable(sql) : 
+    result = query(sql, 'queryObjectIDTable')
+    return result
+
+def getObjectID(sql, oID) : 
+    result = query(sql, 'getObjectID', (oID, ))
+    return result 
+
+def getAssetName(sql, assetName) : 
+    result = query(sql, 'getAssetName', (assetName, ))
+    return result 
+
+def getRecordFromPath(sql, path) : 
+    result = query(sql, 'getRecordFromPath', (path, ))
+    return result 
+
+def getMatteID(sql, mID) : 
+    result = query(sql, 'getMatteID', (mID, ))
+    return result 
+
+def deleteMatteID(sql, mIDs) : 
+    deleteMatteIDs(sql, mIDs)
+    return True
+
+def deleteObjectID(sql, oIDs) : 
+    deleteObjectIDs(sql, oIDs)
+    return True
+
+def getObjectMatteIDs(sql, oID) : 
+    """ mIDs of object, sorted """
+    result = query(sql, 'getObjectMatteIDs', (oID, ))
+    return [a[0] for a in result]
+
+def getObjectMattes(sql, oID) : 
+    """ MatteID records of object in one join. mIDs without MatteID record are not returned """
+    result = query(sql, 'getObjectMattes', (oID, ))
+    return result
+
+def getMaterialMattes(sql, oID) : 
+    """ [(material, mID)] exported with object, ordered by mID """
+    return query(sql, 'getMaterialMattes', (oID, )).fetchall()
+
+def getMattesOfMaterial(sql, material) : 
+    """ [(mID, oID)] carried by material name """
+    return query(sql, 'getMattesOfMaterial', (material, )).fetchall()
+
+def getMaterialsOfMatte(sql, mID) : 
+    """ [(material, oID)] carrying mID """
+    return query(sql, 'getMaterialsOfMatte', (mID, )).fetchall()
+
+# paged read. pages are selected by ID so no read lock is held between pages 
+pageSize = 1000
+
+
+def selectColumns(table, columns=None) : 
+    """ column list for SELECT, names checked against columnIndex. all columns if None """
+    if columns is None : 
+        return '*'
+
+    for column in columns : 
+        if column not in columnIndex[table] : 
+            raise ValueError('Unknown column %s of %s' % (column, table))
+
+    return ', '.join(columns)
+
+
+def readPage(sql, table='ObjectID', afterID=0, size=None, columns=None) : 
+    """ up to size records of table with ID greater than afterID, ordered by ID. 
+        ID is always the first column so the next page starts after result[-1][0] 
+    """
+    if columns is not None : 
+        columns = ['ID'] + [a for a in columns if not a == 'ID']
+
+    statement = 'SELECT %s FROM %s WHERE ID > ? ORDER BY ID LIMIT ?' % (selectColumns(table, columns), table)
+
+    return sql.execute(statement, (afterID, size or pageSize)).fetchall()
+
+
+def iterTable(sql, table='ObjectID', columns=None, size=None) : 
+    """ yield records of table page by page. with columns, records hold only those columns """
+    afterID = 0
+    trim = columns is not None and not 'ID' in columns
+
+    while True : 
+        page = readPage(sql, table, afterID, size, columns)
+
+        if not page : 
+            return
+
+        afterID = page[-1][0]
+
+        for record in page : 
+            if trim : 
+                yield record[1:]
+
+            else : 
+                yield record
+
+
+def readColumn(sql, table, column, size=None) : 
+    """ yield values of one column of table, ordered by ID """
+    for record in iterTable(sql, table, [column], size) : 
+        yield record[0]
+
+
+def iterDatabase(project, dbName='', columns=None, size=None) : 
+    """ readDatabase without holding all ObjectID records in memory """
+    path = openDatabase(project, dbName)
+
+    return iterTable(reader(path), 'ObjectID', columns, size)
+
+# asset search. most records returned, enough for one screen of the viewer 
+searchLimit = 1000
+
+
+def searchAssets(sql, text, limit=None) : 
+    """ ObjectID records whose AssetName, AssetPath or User match all words of text, ordered by ID. 
+        through AssetSearch words match the start of indexed words only, e.g. 'bat' finds lego_batman_md 
+        and 'man' does not. without the index (sqlite without FTS4) words match anywhere with LIKE 
+    """
+    words = text.split()
+    limit = limit or searchLimit
+
+    if not words : 
+        return []
+
+    # index is kept, and so complete, only while its triggers exist 
+    if query(sql, 'hasSearchIndex').fetchone() : 
+        # only word characters go to MATCH, so typed text can not form FTS operators 
+        terms = re.findall('[0-9a-z]+', text.lower())
+
+        if not terms : 
+            return []
+
+        return query(sql, 'searchAssets', (' '.join(['%s*' % a for a in terms]), limit)).fetchall()
+
+    clauses = []
+    params = []
+
+    for word in words : 
+        pattern = '%%%s%%' % word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        clauses.append("(AssetName LIKE ? ESCAPE '\\' OR AssetPath LIKE ? ESCAPE '\\' OR User LIKE ? ESCAPE '\\')")
+        params += [pattern] * 3
+
+    statement = 'SELECT * FROM ObjectID WHERE %s ORDER BY ID LIMIT ?' % ' AND '.join(clauses)
+
+    return sql.execute(statement, params + [limit]).fetchall()
+
+
+# batched lookups. IN lists are chunked below sqlite default limit of 999 bound variables 
+inListSize = 500
+
+
+def chunks(values, size=None) : 
+    """ split values into lists of at most size items """
+    values = list(values)
+    size = size or inListSize
+
+    return [values[i: i + size] for i in range(0, len(values), size)]
+
+
+def lookupMany(sql, table, column, keys) : 
+    """ {key: record} of table where column is in keys. one IN query per chunk """
+    result = dict()
+
+    for chunk in chunks(set(keys)) : 
+        statement = 'SELECT * FROM %s WHERE %s IN (%s)' % (table, column, ','.join(['?'] * len(chunk)))
+
+        for record in sql.execute(statement, chunk) : 
+            result[record[columnIndex[table][column]]] = record
+
+    return result
+
+
+# column position in SELECT * records 
+columnIndex = {'ObjectID': {'ID': 0, 'oID': 1, 'AssetName': 2, 'AssetPath': 3, 'User': 4, 'mID': 5}, 
+                'MatteID': {'ID': 0, 'mID': 1, 'Color': 2, 'MultiMatte': 3, 'VrayMtl': 4}}
+
+
+def getMatteIDs(sql, mIDs) : 
+    """ {mID: MatteID record} of mIDs found in db """
+    return lookupMany(sql, 'MatteID', 'mID', [int(a) for a in mIDs])
+
+def getObjectIDs(sql, oIDs) : 
+    """ {oID: ObjectID record} of oIDs found in db """
+    return lookupMany(sql, 'ObjectID', 'oID', [int(a) for a in oIDs])
+
+def getAssetNames(sql, assetNames) : 
+    """ {AssetName: ObjectID record} of asset names found in db """
+    return lookupMany(sql, 'ObjectID', 'AssetName', assetNames)
+
+def getMatteIDsOfObjects(sql, oIDs) : 
+    """ {oID: [mID, ...]} of oIDs from ObjectMatte """
+    result = dict()
+
+    for chunk in chunks(set([int(a) for a in oIDs])) : 
+        statement = 'SELECT oID, mID FROM ObjectMatte WHERE oID IN (%s) ORDER BY oID, mID' % ','.join(['?'] * len(chunk))
+
+        for oID, mID in sql.execute(statement, chunk) : 
+            result.setdefault(oID, []).append(mID)
+
+    return result
+
+# bulk delete 
+
+def deleteMatteIDs(sql, mIDs) : 
+    """ delete MatteID records of mIDs with IN queries. return number of deleted records """
+    count = 0
+
+    for chunk in chunks(set([int(a) for a in mIDs])) : 
+        inList = ','.join(['?'] * len(chunk))
+        sql.execute('DELETE FROM MaterialMatte WHERE mID IN (%s)' % inList, chunk)
+        count += sql.execute('DELETE FROM MatteID WHERE mID IN (%s)' % inList, chunk).rowcount
+
+    return count
+
+
+def deleteObjectIDs(sql, oIDs) : 
+    """ delete ObjectID records of oIDs and their ObjectMatte rows, MatteID records are kept. 
+        return number of deleted ObjectID records 
+    """
+    count = 0
+
+    for chunk in chunks(set([int(a) for a in oIDs])) : 
+        inList = ','.join(['?'] * len(chunk))
+        sql.execute('DELETE FROM ObjectMatte WHERE oID IN (%s)' % inList, chunk)
+        sql.execute('DELETE FROM MaterialMatte WHERE oID IN (%s)' % inList, chunk)
+        count += sql.execute('DELETE FROM ObjectID WHERE oID IN (%s)' % inList, chunk).rowcount
+
+    return count
+
+
+def deleteAssets(path, oIDs) : 
+    """ delete objects with all their matte records in one transaction. 
+        mattes still listed by an object that is not deleted are kept. 
+        return (deleted ObjectID records, deleted MatteID records) 
+    """
+    objectCount = 0
+    matteCount = 0
+
+    with transaction(path) as sql : 
+        for chunk in chunks(set([int(a) for a in oIDs])) : 
+            inList = ','.join(['?'] * len(chunk))
+
+            matteCount += sql.execute('''DELETE FROM MatteID WHERE mID IN 
+                    (SELECT mID FROM ObjectMatte WHERE oID IN (%s)) AND mID NOT IN 
+                    (SELECT mID FROM ObjectMatte WHERE oID NOT IN (%s))''' % (inList, inList), chunk + chunk).rowcount
+
+            sql.execute('DELETE FROM ObjectMatte WHERE oID IN (%s)' % inList, chunk)
+            sql.execute('DELETE FROM MaterialMatte WHERE oID IN (%s)' % inList, chunk)
+            objectCount += sql.execute('DELETE FROM ObjectID WHERE oID IN (%s)' % inList, chunk).rowcount
+
+    return objectCount, matteCount
+
+
+# multi renderer catalog. renderer dbs of a project attached to one connection 
+catalogDbs = [('vray', 'vrayMatteID'), ('vray_res', 'vrayMatteID_res'), ('rs', 'rsMatteID')]
+
+
+def openCatalog(project, dbNames=None) : 
+    """ connection with each existing renderer db of project attached under its catalogDbs name. 
+        attached names are in catalog.schemas. close the catalog when done 
+    """
+    catalog = sqlite3.connect(':memory:', timeout=busyTimeout, factory=Connection, cached_statements=statementCacheSize)
+    catalog.schemas = []
+
+    for name, dbName in catalogDbs : 
+        if dbNames is not None and not dbName in dbNames : 
+            continue
+
+        path = dbPathCustom(project, dbName)
+
+        if not os.path.exists(path) : 
+            continue
+
+        upgradeSchema(connect(path))
+        catalog.execute('ATTACH DATABASE ? AS %s' % name, (reader(path).path, ))
+        catalog.schemas.append(name)
+
+    return catalog
+
+
+def catalogSelect(catalog, statement, params=()) : 
+    """ run statement on every attached db in one UNION ALL query. 
+        %(db)s in statement is the db name, each record starts with it 
+    """
+    if not catalog.schemas : 
+        return iter([])
+
+    parts = ["SELECT '%s' AS Renderer, * FROM (%s)" % (a, statement % {'db': a}) for a in catalog.schemas]
+
+    return catalog.execute(' UNION ALL '.join(parts), tuple(params) * len(catalog.schemas))
+
+
+def findObjectIDUse(catalog, oID) : 
+    """ (renderer, ObjectID record...) of every renderer db using oID """
+    return catalogSelect(catalog, 'SELECT * FROM %(db)s.ObjectID WHERE oID = ?', (oID, )).fetchall()
+
+def isObjectIDUsed(catalog, oID) : 
+    """ True if any renderer db has oID """
+    return catalogSelect(catalog, 'SELECT oID FROM %(db)s.ObjectID WHERE oID = ?', (oID, )).fetchone() is not None
+
+def isMatteIDUsed(catalog, mID) : 
+    """ True if any renderer db has mID """
+    return catalogSelect(catalog, 'SELECT mID FROM %(db)s.MatteID WHERE mID = ?', (mID, )).fetchone() is not None
+
+def getAssetAcrossRenderers(catalog, assetName) : 
+    """ (renderer, ObjectID record...) of assetName in each renderer db """
+    return catalogSelect(catalog, 'SELECT * FROM %(db)s.ObjectID WHERE AssetName = ?', (assetName, )).fetchall()
+
+def getAssetMattes(catalog, assetName) : 
+    """ (renderer, oID, MatteID record...) of every matte of assetName across renderer dbs """
+    statement = """SELECT ObjectID.oID, MatteID.* FROM %(db)s.ObjectID AS ObjectID 
+            JOIN %(db)s.ObjectMatte AS ObjectMatte ON ObjectMatte.oID = ObjectID.oID 
+            JOIN %(db)s.MatteID AS MatteID ON MatteID.mID = ObjectMatte.mID 
+            WHERE ObjectID.AssetName = ?"""
+
+    return catalogSelect(catalog, statement, (assetName, )).fetchall()
+
+
+# analyzer. whole db check of matte ids, mID lists of ObjectID are the reference 
+
+def parseIDList(value) : 
+    """ ints of an ObjectID.mID list. plain split for the usual '[1001, 1002]' text, parseList otherwise """
+    try : 
+        return [int(a) for a in value.strip('[] ').split(',') if a.strip()]
+
+    except (ValueError, AttributeError) : 
+        return [int(a) for a in parseList(value)]
+
+
+def analyzeDatabase(path, lattices=None, sharedIDs=()) : 
+    """ report of matte id problems in db path as dict, ready for json. 
+        sharedMattes     mIDs listed by more than one object 
+        orphanMattes     MatteID records no object lists 
+        missingMattes    mIDs listed by an object without MatteID record 
+        outOfRange       oIDs on none of the lattices, (start, end, step) of idRanges and FreeRange by default 
+        unsyncedObjects  oIDs whose ObjectMatte rows differ from their mID list 
+        unsyncedMaterials  oIDs whose MaterialMatte rows differ from ObjectMatte and MatteID.VrayMtl 
+        sharedIDs are mIDs every object may list without a record of their own, e.g. presets.extraPreset. 
+        they are left out of sharedMattes and missingMattes 
+    """
+    sql = reader(path)
+    report = {'path': path, 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'sharedIDs': sorted([int(a) for a in sharedIDs])}
+
+    # one read lock for all checks. temp table goes away with the rollback 
+    isolationLevel = sql.isolation_level
+    sql.isolation_level = None
+
+    try : 
+        sql.execute('BEGIN')
+        sql.execute('CREATE TEMP TABLE ListedMatte (oID INTEGER, mID INTEGER)')
+        rows = []
+
+        for oID, mIDs in sql.execute('SELECT oID, mID FROM ObjectID WHERE oID IS NOT NULL') : 
+            rows.extend([(oID, a) for a in set(parseIDList(mIDs))])
+
+        sql.executemany('INSERT INTO ListedMatte (oID, mID) VALUES(?,?)', rows)
+        sql.execute('CREATE INDEX temp.ListedMatte_mID ON ListedMatte (mID, oID)')
+        sql.execute('CREATE TEMP TABLE SharedID (mID INTEGER PRIMARY KEY)')
+        sql.executemany('INSERT OR IGNORE INTO SharedID (mID) VALUES(?)', [(a, ) for a in report['sharedIDs']])
+
+        shared = sql.execute('''SELECT l.mID, GROUP_CONCAT(l.oID), GROUP_CONCAT(o.AssetName, '|') FROM ListedMatte l 
+                JOIN ObjectID o ON o.oID = l.oID WHERE l.mID NOT IN (SELECT mID FROM SharedID) 
+                GROUP BY l.mID HAVING COUNT(*) > 1 ORDER BY l.mID''').fetchall()
+        report['sharedMattes'] = [{'mID': a[0], 'oIDs': [int(b) for b in a[1].split(',')], 'assetNames': a[2].split('|')} for a in shared]
+
+        report['orphanMattes'] = [a[0] for a in sql.execute('''SELECT mID FROM MatteID m WHERE 
+                NOT EXISTS (SELECT 1 FROM ListedMatte l WHERE l.mID = m.mID) ORDER BY mID''')]
+
+        report['missingMattes'] = [{'oID': a[0], 'mID': a[1]} for a in sql.execute('''SELECT oID, mID FROM ListedMatte l WHERE 
+                NOT EXISTS (SELECT 1 FROM MatteID m WHERE m.mID = l.mID) AND l.mID NOT IN (SELECT mID FROM SharedID) 
+                ORDER BY oID, mID''')]
+
+        if lattices is None : 
+            lattices = set(idRanges) | set(sql.execute('SELECT RangeStart, RangeEnd, Step FROM FreeRange').fetchall())
+
+        onLattice = ' OR '.join(['(oID >= %d AND oID < %d AND (oID - %d) %% %d = 0)' % (a[0], a[1], a[0], a[2]) for a in lattices]) or '0'
+        report['outOfRange'] = [{'oID': a[0], 'assetName': a[1]} for a in sql.execute(
+                'SELECT oID, AssetName FROM ObjectID WHERE oID IS NOT NULL AND NOT (%s) ORDER BY oID' % onLattice)]
+
+        report['unsyncedObjects'] = [a[0] for a in sql.execute('''SELECT oID FROM 
+                (SELECT oID, mID FROM ListedMatte EXCEPT SELECT oID, mID FROM ObjectMatte) 
+                UNION SELECT oID FROM 
+                (SELECT oID, mID FROM ObjectMatte EXCEPT SELECT oID, mID FROM ListedMatte) ORDER BY oID''')]
+
+        # material index as rebuildMaterialMattes would write it 
+        sql.execute('CREATE TEMP TABLE ListedMaterial (Material TEXT, mID INTEGER, oID INTEGER)')
+        sql.executemany('INSERT INTO ListedMaterial (Material, mID, oID) VALUES(?,?,?)', set(materialRows(sql.execute(
+                'SELECT ObjectMatte.oID, MatteID.mID, MatteID.VrayMtl FROM ObjectMatte JOIN MatteID ON MatteID.mID = ObjectMatte.mID'))))
+
+        report['unsyncedMaterials'] = [a[0] for a in sql.execute('''SELECT oID FROM 
+                (SELECT Material, mID, oID FROM ListedMaterial EXCEPT SELECT Material, mID, oID FROM MaterialMatte) 
+                UNION SELECT oID FROM 
+                (SELECT Material, mID, oID FROM MaterialMatte EXCEPT SELECT Material, mID, oID FROM ListedMaterial) ORDER BY oID''')]
+
+    finally : 
+        sql.execute('ROLLBACK')
+        sql.isolation_level = isolationLevel
+
+    report['counts'] = dict([(a, len(report[a])) for a in ['sharedMattes', 'orphanMattes', 'missingMattes', 'outOfRange', 
+            'unsyncedObjects', 'unsyncedMaterials']])
+
+    return report
+
+
+def writeReport(report, target) : 
+    """ write report dict of analyzeDatabase or maintainDatabase as json file """
+    with open(target, 'w') as f : 
+        json.dump(report, f, indent=1, sort_keys=True)
+
+    return target
+
+
+# maintenance. run headless, see end of file 
+statsTables = ['ObjectID', 'MatteID', 'ObjectMatte', 'MaterialMatte', 'FreeBlock']
+
+
+def databaseStats(sql) : 
+    """ page counts, free pages, fragmentation in percent, file size and record count of each table """
+    pageCount = sql.execute('PRAGMA page_count').fetchone()[0]
+    freePages = sql.execute('PRAGMA freelist_count').fetchone()[0]
+    fileSize = 0
+
+    for ext in ['', '-wal'] : 
+        if os.path.exists(sql.path + ext) : 
+            fileSize += os.path.getsize(sql.path + ext)
+
+    tables = [a[0] for a in sql.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+
+    return {'pageSize': sql.execute('PRAGMA page_size').fetchone()[0], 
+            'pageCount': pageCount, 
+            'freePages': freePages, 
+            'fragmentation': 100.0 * freePages / pageCount if pageCount else 0.0, 
+            'fileSize': fileSize, 
+            'rows': dict([(a, sql.execute('SELECT COUNT(*) FROM %s' % a).fetchone()[0]) for a in statsTables if a in tables])}
+
+
+def maintainDatabase(path, backup=True) : 
+    """ integrity check, ANALYZE and VACUUM of db path. return report dict with stats before and after. 
+        db is left untouched if integrity check fails. with backup the db before compaction is kept as <db>.bak 
+    """
+    sql = connect(path)
+    upgradeSchema(sql)
+    report = {'path': path, 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'before': databaseStats(sql)}
+
+    start = time.time()
+    report['integrity'] = [a[0] for a in sql.execute('PRAGMA integrity_check')]
+    report['integrityTime'] = time.time() - start
+
+    if not report['integrity'] == ['ok'] : 
+        print 'Integrity check of %s failed, db not changed' % path
+        return report
+
+    start = time.time()
+
+    # manual transaction, ANALYZE inside transaction() would commit it first and run unlocked 
+    isolationLevel = sql.isolation_level
+    sql.isolation_level = None
+
+    try : 
+        retry(sql.execute, 'BEGIN IMMEDIATE')
+
+        try : 
+            sql.execute('ANALYZE')
+            retry(sql.execute, 'COMMIT')
+
+        except Exception : 
+            sql.execute('ROLLBACK')
+            raise
+
+    finally : 
+        sql.isolation_level = isolationLevel
+
+    report['analyzeTime'] = time.time() - start
+
+    if backup : 
+        # compact copy of current db, swapped in place of the .bak once complete 
+        backupPath = path + '.bak'
+        tmpPath = path + '.bak.tmp'
+
+        if os.path.exists(tmpPath) : 
+            os.remove(tmpPath)
+
+        start = time.time()
+        copyDatabase(path, tmpPath)
+
+        if os.path.exists(backupPath) : 
+            os.remove(backupPath)
+
+        os.rename(tmpPath, backupPath)
+        report['backup'] = backupPath
+        report['backupTime'] = time.time() - start
+
+    # VACUUM writes the compact db to a temp file and copies it back through the journal 
+    # under an exclusive lock. it waits for running exports and other sessions keep valid handles 
+    start = time.time()
+    retry(sql.execute, 'VACUUM')
+
+    # in wal mode the compacted pages are still in the wal, move them into the db file 
+    if sql.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal' : 
+        retry(sql.execute, 'PRAGMA wal_checkpoint(TRUNCATE)')
+
+    report['vacuumTime'] = time.time() - start
+
+    report['after'] = databaseStats(sql)
+    clearCache(path)
+
+    return report
+
+
+# snapshot. compressed columnar copy of the tables for sites that can not reach P: 
+snapshotMagic = 'MATTESNAP'
+snapshotVersion = 1
+snapshotTables = ['ObjectID', 'MatteID', 'ObjectMatte']
+
+
+def exportSnapshot(path, target) : 
+    """ write tables of db to snapshot file target. return snapshot size in bytes """
+    sql = connect(path)
+    upgradeSchema(sql)
+    tables = dict()
+
+    # all tables read under one read lock so the snapshot is consistent 
+    isolationLevel = sql.isolation_level
+    sql.isolation_level = None
+
+    try : 
+        sql.execute('BEGIN')
+
+        for table in snapshotTables : 
+            cursor = sql.execute('SELECT * FROM %s' % table)
+            columns = [a[0] for a in cursor.description]
+            rows = cursor.fetchall()
+            tables[table] = {'columns': columns, 'rows': len(rows), 'data': [list(a) for a in zip(*rows)]}
+
+    finally : 
+        sql.execute('ROLLBACK')
+        sql.isolation_level = isolationLevel
+
+    data = {'schemaVersion': getSchemaVersion(sql), 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'tables': tables}
+    content = zlib.compress(json.dumps(data, separators=(',', ':')))
+
+    with open(target, 'wb') as f : 
+        f.write(snapshotMagic)
+        f.write(struct.pack('<H', snapshotVersion))
+        f.write(content)
+
+    return len(snapshotMagic) + 2 + len(content)
+
+
+def readSnapshot(source) : 
+    """ snapshot content as dict. raise ValueError if source is not a snapshot of known version """
+    with open(source, 'rb') as f : 
+        content = f.read()
+
+    if not content.startswith(snapshotMagic) : 
+        raise ValueError('%s is not a matte db snapshot' % source)
+
+    offset = len(snapshotMagic)
+    version = struct.unpack('<H', content[offset: offset + 2])[0]
+
+    if version > snapshotVersion : 
+        raise ValueError('Snapshot version %s of %s is newer than supported %s' % (version, source, snapshotVersion))
+
+    return json.loads(zlib.decompress(content[offset + 2:]))
+
+
+def importSnapshot(source, path) : 
+    """ replace tables of db path with snapshot source. db is created if missing. 
+        return {table: number of records} 
+    """
+    data = readSnapshot(source)
+
+    if data['schemaVersion'] > schemaVersion : 
+        raise ValueError('Snapshot schema v.%s is newer than supported v.%s' % (data['schemaVersion'], schemaVersion))
+
+    sql = connect(path)
+
+    if not sql.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'ObjectID'").fetchone() : 
+        createTable(sql)
+
+    else : 
+        upgradeSchema(sql)
+
+    result = dict()
+
+    # manual transaction so the ddl below is not committed one by one 
+    isolationLevel = sql.isolation_level
+    sql.isolation_level = None
+
+    try : 
+        retry(sql.execute, 'BEGIN IMMEDIATE')
+
+        try : 
+            # triggers of free range and search index would run per row, they are dropped 
+            # for the load and both indexes are rebuilt once 
+            triggers = sql.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN (%s)" % 
+                    ','.join(['?'] * len(snapshotTables)), snapshotTables).fetchall()
+
+            for name, statement in triggers : 
+                sql.execute('DROP TRIGGER %s' % name)
+
+            for table in snapshotTables : 
+                tableData = data['tables'][table]
+                columns = tableData['columns']
+                rows = zip(*tableData['data']) if tableData['data'] else []
+
+                sql.execute('DELETE FROM %s' % table)
+                sql.executemany('INSERT INTO %s (%s) VALUES(%s)' % (table, ', '.join(columns), ','.join(['?'] * len(columns))), rows)
+                result[table] = len(rows)
+
+            for name, statement in triggers : 
+                sql.execute(statement)
+
+            rebuildFreeRanges(sql)
+            rebuildSearchIndex(sql)
+
+            # material index is derived, not stored in snapshot 
+            rebuildMaterialMattes(sql)
+
+            sql.execute('COMMIT')
+
+        except Exception : 
+            sql.execute('ROLLBACK')
+            raise
+
+    finally : 
+        sql.isolation_level = isolationLevel
+
+    clearCache(path)
+
+    return result
+
+
+# offline journal 
+
+def isOffline(path) : 
+    """ True if db path is not known or its dir can not be reached, e.g. share is down """
+    return not path or not os.path.isdir(os.path.dirname(os.path.abspath(path)))
+
+
+def journalPath(path) : 
+    """ offline journal of master db. P:/Lego_X/.local/a.db -> <offlineDir>/Lego_X/.local/a.db.journal """
+    relPath = os.path.splitdrive(os.path.normpath(path))[1].lstrip('\\/')
+    return os.path.normpath(os.path.join(offlineDir, relPath + '.journal'))
+
+
+def journalExport(path, oID, assetName, assetPath, User, mIDs, matteRecords, update=False) : 
+    """ append export to offline journal of db path. 
+        matteRecords are (mID, Color, MultiMatte, VrayMtl) like upsertMatteIDs. 
+        update is True if the asset was already booked as oID when exported 
+    """
+    journal = journalPath(path)
+    journalDir = os.path.dirname(journal)
+
+    if not os.path.exists(journalDir) : 
+        os.makedirs(journalDir)
+
+    entry = {'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'oID': int(oID), 'assetName': assetName, 
+            'assetPath': assetPath, 'user': User, 'mIDs': [int(a) for a in mIDs], 
+            'mattes': [[int(a[0]), a[1], a[2], parseList(a[3])] for a in matteRecords], 'update': update}
+
+    # one line per export, flushed to disk so a crash of maya does not lose it 
+    with open(journal, 'a') as f : 
+        f.write(json.dumps(entry) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+    return journal
+
+
+def readJournal(journal) : 
+    """ entries of journal file in order. an incomplete last line is skipped. 
+        a journal removed by another session has none 
+    """
+    entries = []
+
+    try : 
+        f = open(journal, 'r')
+
+    except IOError : 
+        return entries
+
+    with f : 
+        for line in f : 
+            try : 
+                entries.append(json.loads(line))
+
+            except ValueError : 
+                print 'Skip broken journal line %s' % line.strip()
+
+    return entries
+
+
+def journalClaims(journal) : 
+    """ [(claim time, file)] of journal parts claimed by replayJournal, oldest first. 
+        <journal>.merging of older versions has time 0 
+    """
+    journalDir, name = os.path.split(journal)
+    prefix = name + '.merging'
+    claims = []
+
+    try : 
+        files = os.listdir(journalDir)
+
+    except OSError : 
+        return claims
+
+    for each in files : 
+        if not each.startswith(prefix) : 
+            continue
+
+        try : 
+            claimed = float(each[len(prefix): ].lstrip('.').split('.', 1)[0] or 0)
+
+        except ValueError : 
+            continue
+
+        claims.append((claimed, os.path.join(journalDir, each)))
+
+    return sorted(claims)
+
+
+def claimJournal(source, journal, claimed) : 
+    """ rename source to a journal part of this session. None if another session took it first """
+    claim = '%s.merging.%d.%s-%s-%s-%08x' % (journal, claimed, socket.gethostname(), os.getpid(), 
+            threading.current_thread().ident, random.getrandbits(32))
+
+    try : 
+        os.rename(source, claim)
+
+    except OSError : 
+        return None
+
+    return claim
+
+
+def removeJournal(journal) : 
+    """ remove journal file, gone already if another session merged it """
+    try : 
+        os.remove(journal)
+
+    except OSError : 
+        pass
+
+
+def pendingExports(path) : 
+    """ journal entries of db path not merged yet """
+    journal = journalPath(path)
+    entries = []
+
+    for claimed, claim in journalClaims(journal) : 
+        entries += readJournal(claim)
+
+    return entries + readJournal(journal)
+
+
+def offlineReplica(path) : 
+    """ local replica of db path if there is one, read while the share is down. else empty """
+    replica = replicaPath(path) if replicaDir else ''
+
+    if replica and os.path.exists(replica) : 
+        return replica
+
+    return ''
+
+
+def offlineLookup(path, table, column, keys) : 
+    """ {key: record} like lookupMany while db path can not be reached. 
+        read from the local replica, none are found without one 
+    """
+    replica = offlineReplica(path)
+
+    if not replica : 
+        return dict()
+
+    return lookupMany(connect(replica), table, column, keys)
+
+
+def offlineObjectID(path, assetName, idStart, idRange, idStep) : 
+    """ (oID, booked) of asset while db path can not be reached, like findAssetObjectID. 
+        read from pending exports and the local replica if there is one. the oID is only 
+        provisional, replayJournal checks it against the db 
+    """
+    pending = pendingExports(path)
+
+    for entry in reversed(pending) : 
+        if entry['assetName'] == assetName : 
+            return entry['oID'], True
+
+    used = set([a['oID'] for a in pending])
+    replica = offlineReplica(path)
+
+    if replica : 
+        sql = connect(replica)
+        record = query(sql, 'getObjectOfAsset', (assetName, )).fetchone()
+
+        if record : 
+            return record[0], True
+
+        used.update([a[0] for a in query(sql, 'getUsedSlots', (idStart, idRange, idStart, idStep))])
+
+    for oID in xrange(idStart, idRange, idStep) : 
+        if not oID in used : 
+            return oID, False
+
+    return None, False
+
+
+def journalConflict(sql, entry) : 
+    """ reason why entry can not be merged into db, empty if it can """
+    oID = entry['oID']
+    record = getObjectID(sql, oID).fetchone()
+
+    if record and not record[columnIndex['ObjectID']['AssetName']] == entry['assetName'] : 
+        return 'oID %s is used by %s' % (oID, record[columnIndex['ObjectID']['AssetName']])
+
+    if not record : 
+        record = getAssetName(sql, entry['assetName']).fetchone()
+
+        if record : 
+            return '%s is booked as oID %s' % (entry['assetName'], record[columnIndex['ObjectID']['oID']])
+
+    for chunk in chunks(set([a[0] for a in entry['mattes']])) : 
+        statement = 'SELECT mID, oID FROM ObjectMatte WHERE mID IN (%s) AND NOT oID = ?' % ','.join(['?'] * len(chunk))
+        record = sql.execute(statement, chunk + [oID]).fetchone()
+
+        if record : 
+            return 'mID %s is used by oID %s' % record
+
+    return ''
+
+
+def replayJournal(path) : 
+    """ merge offline journal into db path in one transaction. 
+        entries in conflict with the db are not written and kept in <journal>.conflict. 
+        return (merged entries, [(entry, reason), ...]) 
+    """
+    journal = journalPath(path)
+    now = time.time()
+    claims = []
+
+    # sessions of one user share the journal. each claims what it merges by renaming it, 
+    # parts left by a crashed merge first. entries appended from now on go to a new journal 
+    for claimed, source in journalClaims(journal) : 
+        if now - claimed >= journalClaimTimeout : 
+            claims.append(claimJournal(source, journal, now))
+
+    claims.append(claimJournal(journal, journal, now))
+    claims = [a for a in claims if a]
+    entries = []
+
+    for claim in claims : 
+        entries += readJournal(claim)
+
+    if not entries : 
+        for claim in claims : 
+            removeJournal(claim)
+
+        return [], []
+
+    merged = []
+    conflicts = []
+
+    try : 
+        with transaction(path) as sql : 
+            for entry in entries : 
+                reason = journalConflict(sql, entry)
+
+                if reason : 
+                    conflicts.append((entry, reason))
+                    continue
+
+                upsertObjectID(sql, entry['oID'], entry['assetName'], entry['assetPath'], entry['user'], entry['mIDs'])
+                # material names back to str, stored like exports made online 
+                matteRecords = [(a[0], a[1], a[2], [str(b) for b in a[3]]) for a in entry['mattes']]
+                upsertMatteIDs(sql, matteRecords)
+                setMaterialMattes(sql, entry['oID'], matteRecords)
+                merged.append(entry)
+
+    except Exception : 
+        # nothing written, release claims in order to the next merge of any session 
+        for i, claim in enumerate(claims) : 
+            claimJournal(claim, journal, now - journalClaimTimeout - len(claims) + i)
+
+        raise
+
+    if conflicts : 
+        with open(journal + '.conflict', 'a') as f : 
+            for entry, reason in conflicts : 
+                entry = dict(entry)
+                entry['conflict'] = reason
+                f.write(json.dumps(entry) + '\n')
+
+    for claim in claims : 
+        removeJournal(claim)
+
+    print 'Merged %s offline exports, %s in conflict' % (len(merged), len(conflicts))
+
+    return merged, conflicts
+
+
+# requests served by local db service. each takes the db path first and returns 
+# values that survive a round trip through json 
+
+def exportObject(path, oID, assetName, assetPath, User, mIDs, matteRecords) : 
+    """ write ObjectID record, its MatteID records and material index in one transaction. 
+        return number of matte records 
+    """
+    with transaction(path) as sql : 
+        upsertObjectID(sql, oID, assetName, assetPath, User, mIDs)
+        setMaterialMattes(sql, oID, matteRecords)
+        return upsertMatteIDs(sql, matteRecords)
+
+
+def deleteMattes(path, mIDs) : 
+    """ deleteMatteIDs in one transaction. return number of deleted records """
+    with transaction(path) as sql : 
+        return deleteMatteIDs(sql, mIDs)
+
+
+def findAssetObjectID(path, assetName, idStart, idRange, idStep) : 
+    """ (oID, True) if asset is booked, else (first free oID of lattice, False). nothing is booked """
+    sql = reader(path)
+    record = query(sql, 'getObjectOfAsset', (assetName, )).fetchone()
+
+    if record : 
+        return record[0], True
+
+    return findFreeObjectID(sql, idStart, idRange, idStep), False
+
+
+def lookupRecords(path, table, column, keys) : 
+    """ records of table where column is in keys, like lookupMany """
+    if not table in columnIndex : 
+        raise ValueError('Unknown table %s' % table)
+
+    selectColumns(table, [column])
+
+    return lookupMany(reader(path), table, column, keys).values()
+
+
+serviceOps = {'allocate': allocateObjectID, 'export': exportObject, 'deleteAssets': deleteAssets, 
+            'deleteMattes': deleteMattes, 'findObjectID': findAssetObjectID, 'lookup': lookupRecords}
+
+# requests queued by the service and committed in batches 
+serviceWrites = ['allocate', 'export', 'deleteAssets', 'deleteMattes']
+
+
+def parseAddress(address) : 
+    """ (host, port) of 'host:port' """
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+def fromService(value) : 
+    """ json value back to records as read from sqlite, lists to tuples and unicode to str """
+    if isinstance(value, list) : 
+        return tuple([fromService(a) for a in value])
+
+    if isinstance(value, unicode) : 
+        return value.encode('utf-8')
+
+    return value
+
+
+def closeService() : 
+    """ close service socket of current thread """
+    stream = getattr(_serviceLocal, 'stream', None)
+    _serviceLocal.stream = None
+
+    if stream is not None : 
+        stream.close()
+
+
+def requestService(op, path, *args) : 
+    """ run op on local db service. raise socket.error if service is not reachable, 
+        and the error type of the service if op failed there 
+    """
+    stream = getattr(_serviceLocal, 'stream', None)
+
+    if stream is None : 
+        conn = socket.create_connection(parseAddress(serviceAddress), serviceConnectTimeout)
+        conn.settimeout(serviceTimeout)
+        stream = conn.makefile('rwb')
+        conn.close()
+        _serviceLocal.stream = stream
+
+    try : 
+        stream.write(json.dumps({'op': op, 'path': path, 'args': args}) + '\n')
+        stream.flush()
+        line = stream.readline()
+
+    except (socket.error, IOError) : 
+        closeService()
+        raise
+
+    if not line : 
+        closeService()
+        raise socket.error('db service closed connection')
+
+    reply = json.loads(line)
+
+    if 'error' in reply : 
+        raise serviceErrors.get(reply['type'], RuntimeError)(reply['error'])
+
+    return fromService(reply['result'])
+
+
+def serviceCall(op, path, *args) : 
+    """ run op on local db service, or on db file directly if service is off or not running """
+    if not serviceAddress == 'off' and time.time() >= _serviceState['downUntil'] : 
+        try : 
+            return requestService(op, path, *args)
+
+        except (socket.error, IOError) as e : 
+            print 'DB service %s not reachable, use db file : %s' % (serviceAddress, e)
+            _serviceState['downUntil'] = time.time() + serviceRetryInterval
+
+    return serviceOps[op](path, *args)
+
+
+def serviceAllocate(path, assetName, assetPath, User, idStart, idRange, idStep) : 
+    """ allocateObjectID through local db service """
+    return serviceCall('allocate', path, assetName, assetPath, User, idStart, idRange, idStep)
+
+def serviceExport(path, oID, assetName, assetPath, User, mIDs, matteRecords) : 
+    """ exportObject through local db service """
+    return serviceCall('export', path, oID, assetName, assetPath, User, mIDs, matteRecords)
+
+def serviceDeleteAssets(path, oIDs) : 
+    """ deleteAssets through local db service """
+    return tuple(serviceCall('deleteAssets', path, [int(a) for a in oIDs]))
+
+def serviceDeleteMattes(path, mIDs) : 
+    """ deleteMattes through local db service """
+    return serviceCall('deleteMattes', path, [int(a) for a in mIDs])
+
+def serviceFindObjectID(path, assetName, idStart, idRange, idStep) : 
+    """ findAssetObjectID through local db service """
+    return tuple(serviceCall('findObjectID', path, assetName, idStart, idRange, idStep))
+
+def serviceLookup(path, table, column, keys) : 
+    """ {key: record} of lookupRecords through local db service """
+    records = serviceCall('lookup', path, table, column, list(keys))
+    return dict([(a[columnIndex[table][column]], tuple(a)) for a in records])
+
+
+def getAllMID(sql) : 
+    result = query(sql, 'getAllMID')
+    return result
+
+def getAllOID(sql) : 
+    result = query(sql, 'getAllOID')
+    return result
+
+
+
+# conn.execute("INSERT INTO COMPANY (ID,NAME,AGE,ADDRESS,SALARY) \
+#       VALUES (1, 'Paul', 32, 'California', 20000.00 )");
+
+# conn.execute("INSERT INTO COMPANY (ID,NAME,AGE,ADDRESS,SALARY) \
+#       VALUES (2, 'Allen', 25, 'Texas', 15000.00 )");
+
+# conn.execute("INSERT INTO COMPANY (ID,NAME,AGE,ADDRESS,SALARY) \
+#       VALUES (3, 'Teddy', 23, 'Norway', 20000.00 )");
+
+# conn.execute("INSERT INTO COMPANY (ID,NAME,AGE,ADDRESS,SALARY) \
+#       VALUES (4, 'Mark', 25, 'Rich-Mond ', 65000.00 )");
+
+
+
+if __name__ == '__main__' : 
+    # headless maintenance, e.g. from a nightly job 
+    # python create_db.py maintain|analyze <db path> [report.json] 
+    command, path = sys.argv[1], sys.argv[2]
+
+    if command == 'maintain' : 
+        result = maintainDatabase(path)
+
+    elif command == 'analyze' : 
+        # extra preset mattes are listed by every asset 
+        import presets
+        result = analyzeDatabase(path, sharedIDs=presets.extraPreset.keys())
+
+    else : 
+        raise SystemExit('Unknown command %s, use maintain or analyze' % command)
+
+    if len(sys.argv) > 3 : 
+        writeReport(result, sys.argv[3])
+
+    print json.dumps(result, indent=1, sort_keys=True)
+    disconnect()
@@ -1,6 +1,5 @@
 #Import python modules
 import os, sys
-import sqlite3
 
 #Import GUI
 from PySide import QtCore
@@ -23,6 +22,8 @@ from tool.matte import create_db as db
 reload(db)
 from tool.matte import presets
 reload(presets)
+from tool.matte import db_worker
+reload(db_worker)
 
 moduleFile = sys.modules[__name__].__file__
 moduleDir = os.path.dirname(moduleFile)
@@ -97,6 +98,9 @@ class MyForm(QtGui.QMainWindow):
         self.dbColor = [0, 20, 60]
         self.presetColor = [0, 20, 100]
 
+        # tables and search results are read by dbService 
+        self.dbService = db_worker.DbService(self)
+
         self.initFunctions()
         self.initSignals()
 
@@ -104,12 +108,13 @@ class MyForm(QtGui.QMainWindow):
     def initFunctions(self) : 
         self.readDb()
         self.setUI()
-        self.viewObjectIDTable()
+        # objectID table is filled once db is open (onReadDb)
 
 
     def initSignals(self) : 
         self.ui.project_comboBox.currentIndexChanged.connect(self.projectAction)
         self.ui.objectID_tableWidget.itemSelectionChanged.connect(self.viewMatteIDTable)
+        self.ui.search_lineEdit.textChanged.connect(self.searchAction)
 
         # button 
         self.ui.delete_pushButton.clicked.connect(self.deleteObjectID)
@@ -118,10 +123,12 @@ class MyForm(QtGui.QMainWindow):
 
     def readDb(self) : 
         project = str(self.ui.project_comboBox.currentText())
-        dbResult = db.readDatabase(project)
-        self.ui.dbPath_lineEdit.setText(db.dbPath(project))
+        # only the db path is kept, onReadDb reads the objectID table 
+        self.dbService.request('readDb', self.onReadDb, db.openDatabase, project)
 
-        self.dbData = dbResult
+    def onReadDb(self, dbPath) : 
+        self.ui.dbPath_lineEdit.setText(dbPath)
+        self.viewObjectIDTable()
 
     def setUI(self) : 
         self.setProject()
@@ -147,13 +154,28 @@ class MyForm(QtGui.QMainWindow):
             self.readDb()
 
 
-    def getDbData(self, col) : 
-        return [a[col] for a in self.dbData]
+    def viewObjectIDTable(self) : 
+        """ read ObjectID table in db thread, then fill table. only matching records if search text is set """
+        dbPath = str(self.ui.dbPath_lineEdit.text())
+        text = unicode(self.ui.search_lineEdit.text()).strip()
 
+        # db not open yet, onReadDb calls again 
+        if not dbPath : 
+            return 
 
-    def viewObjectIDTable(self) : 
-        # re read DB
-        self.readDb()
+        # each key stroke replaces the pending request, only the latest text is searched 
+        if text : 
+            self.dbService.request('objectIDTable', self.fillObjectIDTable, fetchSearch, dbPath, text)
+
+        else : 
+            self.dbService.request('objectIDTable', self.fillObjectIDTable, fetchTable, dbPath, 'ObjectID')
+
+
+    def searchAction(self, text) : 
+        self.viewObjectIDTable()
+
+
+    def fillObjectIDTable(self, records) : 
         widget = 'objectID_tableWidget'
         widget2 = 'matteID_tableWidget'
         height = 20
@@ -161,8 +183,8 @@ class MyForm(QtGui.QMainWindow):
 
         self.clearTable(widget)
         self.clearTable(widget2)
-        
-        for each in self.dbData : 
+
+        for each in records : 
             ID = str(each[self.idCol])
             oID = str(each[self.oIDCol])
             assetName = str(each[self.assetNameCol])
@@ -190,12 +212,20 @@ class MyForm(QtGui.QMainWindow):
 
     def viewMatteIDTable(self) : 
         # sel item 
-        selMatteID = self.getDataFromSelectedRange(self.mIDsCol, 'objectID_tableWidget')
-        selMatteIDList = [a for a in eval(selMatteID[0])]
+        selOID = self.getDataFromSelectedRange(self.oIDCol, 'objectID_tableWidget')
+
+        if not selOID : 
+            return
+
+        dbPath = str(self.ui.dbPath_lineEdit.text())
+        self.dbService.request('matteIDTable', self.fillMatteIDTable, fetchObjectMattes, dbPath, int(selOID[0]))
+
+
+    def fillMatteIDTable(self, result) : 
+        selMatteIDList, matteIDs = result
 
         # re read DB
         # self.readDb()
-        matteIDs = self.getMatteIDValue(selMatteID)
         presetMatteIDs = presets.extraPreset
 
         row = 0 
@@ -252,51 +282,56 @@ class MyForm(QtGui.QMainWindow):
 
 
 
-    def getMatteIDValue(self, matteIDs) : 
-
-        if matteIDs : 
-            mIDs = eval(matteIDs[0])
-            project = str(self.ui.dbPath_lineEdit.text())
-            conn = sqlite3.connect(project)
-            matteIDValue = []
-
-            for eachID in mIDs : 
-                result = db.getMatteID(conn, eachID)
-
-                for each in result : 
-                    if not each in matteIDValue : 
-                        matteIDValue.append(each)
-
-            return matteIDValue
-
-
-
     def projectAction(self) : 
+        # drop connection of previous project before switching db 
+        db.disconnect(str(self.ui.dbPath_lineEdit.text()))
         self.readDb()
-        self.viewObjectIDTable()
 
 
     # button action 
     def deleteObjectID(self) : 
-        conn = sqlite3.connect(str(self.ui.dbPath_lineEdit.text()))
         oIDs = self.getDataFromSelectedRange(self.oIDCol, 'objectID_tableWidget')
-        mIDs = self.getDataFromSelectedRange(self.mIDsCol, 'objectID_tableWidget')
-        db.deleteObjectID(conn, oIDs)
-        db.deleteMatteID(conn, eval(mIDs[0]))
-        conn.commit()
-        conn.close()
+
+        if not oIDs : 
+            return
+
+        # asset and all its matte records in one transaction 
+        self.setBusy(True)
+        self.dbService.request('delete', self.onDeleteObjectID, db.serviceDeleteAssets, str(self.ui.dbPath_lineEdit.text()), oIDs, 
+                failed=self.onDeleteFailed)
+
+    def onDeleteObjectID(self, result) : 
+        objectCount, matteCount = result
+        self.setBusy(False)
+        print 'Deleted %s objects, %s mattes' % (objectCount, matteCount)
 
         self.viewObjectIDTable()
 
     def deleteMatteID(self) : 
-        conn = sqlite3.connect(str(self.ui.dbPath_lineEdit.text()))
         mIDs = self.getDataFromSelectedRange(self.midCol, 'matteID_tableWidget')
-        db.deleteMatteID(conn, mIDs)
-        conn.commit()
-        conn.close()
+
+        if not mIDs : 
+            return
+
+        self.setBusy(True)
+        self.dbService.request('delete', self.onDeleteMatteID, db.serviceDeleteMattes, str(self.ui.dbPath_lineEdit.text()), mIDs, 
+                failed=self.onDeleteFailed)
+
+    def onDeleteMatteID(self, count) : 
+        self.setBusy(False)
+        print 'Deleted %s mattes' % count
 
         self.viewMatteIDTable()
 
+    def onDeleteFailed(self, message) : 
+        self.setBusy(False)
+        self.messageBox('Error', 'Delete failed\n%s' % message.strip().splitlines()[-1])
+
+    def setBusy(self, busy) : 
+        """ delete buttons are off while a delete runs in db thread """
+        self.ui.delete_pushButton.setEnabled(not busy)
+        self.ui.delete2_pushButton.setEnabled(not busy)
+
     # Table Functions 
 
     def insertRow(self, row, height, widget) : 
@@ -382,6 +417,31 @@ class MyForm(QtGui.QMainWindow):
             eval(cmd2)
 
 
+    def messageBox(self, title, description) : 
+        result = QtGui.QMessageBox.question(self,title,description,QtGui.QMessageBox.Ok)
+
+        return result
+
+
+
+# requests of the objectID and matte tables 
+
+def fetchTable(dbPath, table) : 
+    """ all records of table, read page by page """
+    return list(db.iterTable(db.reader(dbPath), table))
+
+
+def fetchSearch(dbPath, text) : 
+    """ ObjectID records matching text """
+    return db.searchAssets(db.reader(dbPath), text)
+
+
+def fetchObjectMattes(dbPath, oID) : 
+    """ (mIDs, MatteID records) of object """
+    conn = db.reader(dbPath)
+
+    return db.getObjectMatteIDs(conn, oID), db.getObjectMattes(conn, oID).fetchall()
+
 
 def deleteUI(ui) : 
     if mc.window(ui, exists = True) : 
@@ -0,0 +1,597 @@
+'''
+benchmark create_db on synthetic data
+
+mayapy db_benchmark.py [rows]       exits 1 if a snapshot or replica check fails
+mayapy db_benchmark.py suite <result.json> [assets] [mattes]
+mayapy db_benchmark.py compare <base.json> <result.json>
+'''
+
+#Import python modules
+import os, sys
+import json
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+
+moduleFile = sys.modules[__name__].__file__
+moduleDir = os.path.dirname(os.path.abspath(moduleFile))
+sys.path.append(moduleDir)
+
+import create_db as db
+import presets
+
+
+def createSyntheticDb(path, rows, upgrade=True) :
+    """ fill ObjectID and MatteID with rows records each. upgrade=False keeps pre versioning schema """
+    sql = db.sqlite3.connect(path)
+    sql.execute('PRAGMA synchronous = OFF')
+
+    if upgrade :
+        db.createTable(sql)
+
+    else :
+        createLegacyTable(sql)
+
+    objectRows = [(1000 + i * 20, 'asset%06d_md' % i, 'P:/Lego_Bench/asset/asset%06d/ref/asset%06d_md.ma' % (i, i), 'bench', str([1000 + i * 20 + 1])) for i in xrange(rows)]
+    matteRows = [(1000 + i * 20 + 1, 'red', 'mm_asset%06d' % i, str(['mtl%06d_Vray' % i])) for i in xrange(rows)]
+
+    sql.executemany('INSERT INTO ObjectID (oID, AssetName, AssetPath, User, mID) VALUES(?,?,?,?,?)', objectRows)
+    sql.executemany('INSERT INTO MatteID (mID, Color, MultiMatte, VrayMtl) VALUES(?,?,?,?)', matteRows)
+    sql.commit()
+
+    return sql
+
+
+def createLegacyTable(sql) :
+    """ tables as created before schema versioning """
+    sql.execute('CREATE TABLE ObjectID (ID INTEGER PRIMARY KEY AUTOINCREMENT, oID INTEGER, AssetName TEXT, AssetPath TEXT, User TEXT, mID TEXT)')
+    sql.execute('CREATE TABLE MatteID (ID INTEGER PRIMARY KEY AUTOINCREMENT, mID INTEGER, Color TEXT, MultiMatte TEXT, VrayMtl TEXT)')
+    sql.commit()
+
+
+def timeLookups(sql, rows, count=1000) :
+    """ average seconds per call of each lookup over count random keys """
+    keys = [random.randrange(rows) for i in xrange(count)]
+    lookups = [('getObjectID', lambda i: db.getObjectID(sql, 1000 + i * 20)),
+                ('getAssetName', lambda i: db.getAssetName(sql, 'asset%06d_md' % i)),
+                ('getRecordFromPath', lambda i: db.getRecordFromPath(sql, 'P:/Lego_Bench/asset/asset%06d/ref/asset%06d_md.ma' % (i, i))),
+                ('getMatteID', lambda i: db.getMatteID(sql, 1000 + i * 20 + 1))]
+    result = dict()
+
+    for name, func in lookups :
+        start = time.time()
+
+        for key in keys :
+            func(key).fetchall()
+
+        result[name] = (time.time() - start) / count
+
+    return result
+
+
+def benchIndexes(rows=100000, count=1000) :
+    """ lookup cost of legacy db, then after upgradeSchema migrates it in place """
+    tmpDir = tempfile.mkdtemp()
+    path = os.path.join(tmpDir, 'vrayMatteID.db')
+
+    try :
+        sql = createSyntheticDb(path, rows, upgrade=False)
+        before = timeLookups(sql, rows, count)
+
+        start = time.time()
+        db.upgradeSchema(sql)
+        migrate = time.time() - start
+
+        after = timeLookups(sql, rows, count)
+        sql.close()
+
+    finally :
+        shutil.rmtree(tmpDir)
+
+    print '%s rows, %s lookups each' % (rows, count)
+    print 'migration %.3f s' % migrate
+
+    for name in sorted(before) :
+        print '%-20s %10.1f us -> %8.1f us' % (name, before[name] * 1e6, after[name] * 1e6)
+
+    return before, after
+
+
+def legacyLookups(sql) :
+    """ accessors as they were before the query registry, sql text built per call """
+    return [('getObjectID', lambda i: sql.execute('SELECT * FROM ObjectID WHERE oID = %s' % (1000 + i * 20))),
+            ('getAssetName', lambda i: sql.execute('SELECT * FROM ObjectID WHERE AssetName = "%s"' % ('asset%06d_md' % i))),
+            ('getMatteID', lambda i: sql.execute('SELECT * FROM MatteID WHERE mID = %s' % (1000 + i * 20 + 1)))]
+
+
+def registryLookups(sql) :
+    return [('getObjectID', lambda i: db.getObjectID(sql, 1000 + i * 20)),
+            ('getAssetName', lambda i: db.getAssetName(sql, 'asset%06d_md' % i)),
+            ('getMatteID', lambda i: db.getMatteID(sql, 1000 + i * 20 + 1))]
+
+
+def benchPrepared(rows=10000, count=10000) :
+    """ per call latency of string formatted sql against registered bound queries """
+    tmpDir = tempfile.mkdtemp()
+    path = os.path.join(tmpDir, 'vrayMatteID.db')
+    keys = [random.randrange(rows) for i in xrange(count)]
+    result = dict()
+
+    try :
+        createSyntheticDb(path, rows).close()
+        sql = db.sqlite3.connect(path, cached_statements=db.statementCacheSize)
+
+        for mode, lookups in [('before', legacyLookups(sql)), ('after', registryLookups(sql))] :
+            for name, func in lookups :
+                start = time.time()
+
+                for key in keys :
+                    func(key).fetchall()
+
+                result.setdefault(name, dict())[mode] = (time.time() - start) / count
+
+        sql.close()
+
+    finally :
+        shutil.rmtree(tmpDir)
+
+    print '%s rows, %s lookups each' % (rows, count)
+
+    for name in sorted(result) :
+        print '%-20s %8.1f us -> %8.1f us' % (name, result[name]['before'] * 1e6, result[name]['after'] * 1e6)
+
+    return result
+
+
+def benchFreeRange(rows=100000, count=1000) : 
+    """ next free oID from scan of ObjectID against free range index, lattice filled up to rows """
+    tmpDir = tempfile.mkdtemp()
+    path = os.path.join(tmpDir, 'vrayMatteID.db')
+    idRange = (1000, 1000 + (rows + 1000) * 20, 20)
+    result = dict()
+
+    try : 
+        sql = createSyntheticDb(path, rows)
+
+        start = time.time()
+        for i in xrange(count) : 
+            db.query(sql, 'scanFreeObjectID', (idRange[0], idRange[2], idRange[0], idRange[1], idRange[0], idRange[2], idRange[1])).fetchone()
+        result['scan'] = (time.time() - start) / count
+
+        start = time.time()
+        db.registerIDRange(sql, *idRange)
+        result['index build'] = time.time() - start
+
+        start = time.time()
+        for i in xrange(count) : 
+            db.findFreeObjectID(sql, *idRange)
+        result['index'] = (time.time() - start) / count
+
+        start = time.time()
+        for i in xrange(count) : 
+            db.idRangeUsage(sql, *idRange)
+            db.largestFreeBlock(sql, *idRange)
+        result['usage'] = (time.time() - start) / count
+
+        sql.close()
+
+    finally : 
+        shutil.rmtree(tmpDir)
+
+    print '%s used slots' % rows
+    print 'next free  scan %10.1f us -> index %8.1f us' % (result['scan'] * 1e6, result['index'] * 1e6)
+    print 'usage and largest block %.1f us, index build %.3f s' % (result['usage'] * 1e6, result['index build'])
+
+    return result
+
+
+def benchAnalyze(rows=100000) : 
+    """ analyzeDatabase run time, with a few problems of each kind planted """
+    tmpDir = tempfile.mkdtemp()
+    path = os.path.join(tmpDir, 'vrayMatteID.db')
+
+    try : 
+        sql = createSyntheticDb(path, rows)
+        sql.execute('INSERT INTO ObjectMatte (oID, mID) SELECT oID, oID + 1 FROM ObjectID')
+        # shared, missing, orphan, out of range, unsynced objects and materials 
+        sql.execute("UPDATE ObjectID SET mID = '[1021, 1001]' WHERE oID = 1020")
+        sql.execute("UPDATE ObjectID SET mID = '[1041, 999999]' WHERE oID = 1040")
+        sql.execute("INSERT INTO MatteID (mID, Color, MultiMatte, VrayMtl) VALUES (999998, 'red', 'mm_orphan', '[]')")
+        sql.execute("INSERT INTO ObjectID (oID, AssetName, AssetPath, User, mID) VALUES (1005, 'offLattice_md', '', 'bench', '[]')")
+        # extra preset mattes, listed by many assets without a record. not reported 
+        sql.execute("UPDATE ObjectID SET mID = '[100, 1061]' WHERE oID = 1060")
+        sql.execute("UPDATE ObjectID SET mID = '[100, 1081]' WHERE oID = 1080")
+        sql.execute('INSERT INTO ObjectMatte (oID, mID) VALUES (1060, 100), (1080, 100)')
+        # material index of an asset written by an exporter that did not sync it 
+        db.rebuildMaterialMattes(sql)
+        sql.execute('DELETE FROM MaterialMatte WHERE oID = 1100')
+        sql.commit()
+        sql.close()
+
+        start = time.time()
+        # synthetic oIDs run past the real lattices 
+        report = db.analyzeDatabase(path, [(1000, 1000 + rows * 20, 20)], presets.extraPreset.keys())
+        duration = time.time() - start
+        db.disconnect()
+
+    finally : 
+        shutil.rmtree(tmpDir)
+
+    print '%s rows, analyze %.3f s' % (rows, duration)
+    print ', '.join(['%s %s' % (a, report['counts'][a]) for a in sorted(report['counts'])])
+
+    return report, duration
+
+
+def tableContent(sql) : 
+    """ records of snapshot tables, to compare dbs """
+    return dict([(a, sql.execute('SELECT * FROM %s ORDER BY 1, 2' % a).fetchall()) for a in db.snapshotTables])
+
+
+def indexContent(sql) : 
+    """ free range and search index, rebuilt by importSnapshot """
+    content = {'FreeBlock': sql.execute('SELECT * FROM FreeBlock ORDER BY 1, 2').fetchall(), 
+            'FreeRange': sql.execute('SELECT RangeStart, RangeEnd, Step, Free FROM FreeRange ORDER BY 1, 2, 3').fetchall()}
+
+    if db.query(sql, 'hasSearchIndex').fetchone() : 
+        content['AssetSearch'] = sql.execute('SELECT docid, AssetName, AssetPath, User FROM AssetSearch ORDER BY docid').fetchall()
+
+    return content
+
+
+def benchSnapshot(rows=100000) : 
+    """ size and load time of a snapshot against copying the db file. checks the round trip """
+    tmpDir = tempfile.mkdtemp()
+    path = os.path.join(tmpDir, 'vrayMatteID.db')
+    snapshot = os.path.join(tmpDir, 'vrayMatteID.snap')
+    copyPath = os.path.join(tmpDir, 'copy.db')
+    loadPath = os.path.join(tmpDir, 'load.db')
+
+    try : 
+        sql = createSyntheticDb(path, rows)
+        sql.execute('INSERT INTO ObjectMatte (oID, mID) SELECT oID, oID + 1 FROM ObjectID')
+        sql.commit()
+        sql.close()
+
+        start = time.time()
+        shutil.copyfile(path, copyPath)
+        copyTime = time.time() - start
+
+        start = time.time()
+        size = db.exportSnapshot(path, snapshot)
+        exportTime = time.time() - start
+
+        start = time.time()
+        db.importSnapshot(snapshot, loadPath)
+        loadTime = time.time() - start
+
+        match = tableContent(db.connect(path)) == tableContent(db.connect(loadPath))
+        match = match and indexContent(db.connect(path)) == indexContent(db.connect(loadPath))
+        dbSize = os.path.getsize(path)
+        db.disconnect()
+
+    finally : 
+        shutil.rmtree(tmpDir)
+
+    print '%s rows' % rows
+    print 'db file  %8.1f KB, copy %.3f s' % (dbSize / 1024.0, copyTime)
+    print 'snapshot %8.1f KB, export %.3f s, load %.3f s, round trip %s' % (size / 1024.0, exportTime, loadTime, 'ok' if match else 'MISMATCH')
+
+    return dbSize, size, copyTime, exportTime, loadTime, match
+
+
+def objectCount(sql) : 
+    return sql.execute('SELECT COUNT(*) FROM ObjectID').fetchone()[0]
+
+
+def benchReplica(rows=100000, writes=100) : 
+    """ write time with replica mode on and off, master and replica in two local dirs. 
+        checks reads see the writes and that a failing replica copy does not fail a write 
+    """
+    tmpDir = tempfile.mkdtemp()
+    path = os.path.join(tmpDir, 'master', 'vrayMatteID.db')
+    replicaDir = os.path.join(tmpDir, 'replica')
+    lattice = (1000 + rows * 20, 1000 + (rows + 2 * writes + 2) * 20, 20)
+    checks = dict()
+
+    os.makedirs(os.path.dirname(path))
+
+    try : 
+        createSyntheticDb(path, rows).close()
+
+        start = time.time()
+        for i in xrange(writes) : 
+            db.allocateObjectID(path, 'direct%s_md' % i, '', 'bench', *lattice)
+        directTime = time.time() - start
+
+        db.setReplicaDir(replicaDir)
+        replica = db.replicaPath(path)
+        checks['replicaRead'] = db.reader(path).path == replica
+
+        start = time.time()
+        for i in xrange(writes) : 
+            db.allocateObjectID(path, 'replica%s_md' % i, '', 'bench', *lattice)
+        replicaTime = time.time() - start
+
+        start = time.time()
+        checks['refreshed'] = objectCount(db.reader(path)) == rows + 2 * writes
+        refreshTime = time.time() - start
+
+        # replica dir is a file, so the next copy fails 
+        db.disconnect(path)
+        shutil.rmtree(replicaDir)
+        open(replicaDir, 'w').close()
+
+        try : 
+            db.allocateObjectID(path, 'failedCopy_md', '', 'bench', *lattice)
+            checks['writeOnFailedCopy'] = True
+
+        except Exception as e : 
+            print 'write failed : %s' % e
+            checks['writeOnFailedCopy'] = False
+
+        sql = db.reader(path)
+        checks['masterOnFailedCopy'] = sql.path == os.path.normpath(path) and objectCount(sql) == rows + 2 * writes + 1
+
+        os.remove(replicaDir)
+        db.markReplicaStale(path)
+        sql = db.reader(path)
+        checks['recovered'] = sql.path == replica and objectCount(sql) == rows + 2 * writes + 1
+
+    finally : 
+        db.setReplicaDir('')
+        db.disconnect()
+        shutil.rmtree(tmpDir)
+
+    print '%s rows, %s writes' % (rows, writes)
+    print 'write %.2f ms, with replica %.2f ms, refresh on next read %.3f s' % (directTime / writes * 1000, replicaTime / writes * 1000, refreshTime)
+    print ', '.join(['%s %s' % (a, 'ok' if checks[a] else 'FAILED') for a in sorted(checks)])
+
+    return directTime, replicaTime, refreshTime, checks
+
+
+def stressWriter(args) :
+    """ one artist session. export assets like doExport, return (succeeded, failed) """
+    path, writer, exports, mattes = args
+    succeeded = 0
+    failed = 0
+
+    for i in xrange(exports) :
+        oID = 1000 + (writer * exports + i) * 20
+        records = [(oID + m + 1, 'red', 'mm_writer%s' % writer, ['mtl%s_%s_Vray' % (i, m)]) for m in xrange(mattes)]
+
+        try :
+            with db.transaction(path) as conn :
+                db.upsertObjectID(conn, oID, 'writer%s_asset%s_md' % (writer, i), 'P:/Lego_Bench/asset', 'writer%s' % writer, [a[0] for a in records])
+                db.upsertMatteIDs(conn, records)
+
+            # viewer refresh after export
+            db.queryObjectIDTable(db.connect(path)).fetchall()
+            succeeded += 1
+
+        except db.sqlite3.Error as e :
+            print 'writer %s export %s failed : %s' % (writer, i, e)
+            failed += 1
+
+    db.disconnect()
+
+    return succeeded, failed
+
+
+def stressTest(writers=16, exports=50, mattes=20, journal='') :
+    """ concurrent writer processes on one local db file. report throughput and failure rate """
+    tmpDir = tempfile.mkdtemp()
+    path = os.path.join(tmpDir, 'vrayMatteID.db')
+
+    if journal :
+        os.environ[db.journalEnv] = journal
+
+    try :
+        sql = db.connect(path)
+        db.createTable(sql)
+        mode = sql.execute('PRAGMA journal_mode').fetchone()[0]
+        db.disconnect()
+
+        pool = multiprocessing.Pool(writers)
+        start = time.time()
+        result = pool.map(stressWriter, [(path, i, exports, mattes) for i in xrange(writers)])
+        duration = time.time() - start
+        pool.close()
+        pool.join()
+
+        sql = db.sqlite3.connect(path)
+        rows = sql.execute('SELECT COUNT(*) FROM ObjectID').fetchone()[0]
+        sql.close()
+
+    finally :
+        os.environ.pop(db.journalEnv, None)
+        shutil.rmtree(tmpDir)
+
+    succeeded = sum([a[0] for a in result])
+    failed = sum([a[1] for a in result])
+    total = succeeded + failed
+
+    print '%s journal, %s writers x %s exports of %s mattes' % (mode, writers, exports, mattes)
+    print '%.1f exports/s, %s failed (%.1f %%), %s rows in db' % (succeeded / duration, failed, 100.0 * failed / total, rows)
+
+    return succeeded, failed, duration
+
+
+def measure(results, name, func, calls) : 
+    """ time func over calls, a list of argument tuples. store count, total and mean seconds under name """
+    start = time.time()
+
+    for args in calls : 
+        func(*args)
+
+    total = time.time() - start
+    results[name] = {'count': len(calls), 'total': total, 'mean': total / max(len(calls), 1)}
+
+    return total
+
+
+def projectAssets(assets=1000, mattes=8, propShare=0.5, lattices=None) : 
+    """ [(oID, assetName, assetPath, matteRecords), ...] of a synthetic project. chars and props are laid 
+        out on lattices {'char': (start, end, step), 'prop': ...}, create_db lattices by default 
+    """
+    lattices = lattices or {'char': db.charIDRange, 'prop': db.propIDRange}
+    counts = {'prop': int(assets * propShare)}
+    counts['char'] = assets - counts['prop']
+    result = []
+
+    for kind in ['char', 'prop'] : 
+        idStart, idRange, idStep = lattices[kind]
+        slots = (idRange - idStart + idStep - 1) / idStep
+
+        if counts[kind] > slots : 
+            raise ValueError('%s %ss do not fit %s slots of lattice %s' % (counts[kind], kind, slots, lattices[kind]))
+
+        for i in xrange(counts[kind]) : 
+            oID = idStart + i * idStep
+            assetName = '%s%05d_md' % (kind, i)
+            assetPath = 'P:/Lego_Bench/asset/3D/%s/%s%05d/ref/%s.ma' % (kind, kind, i, assetName)
+            matteRecords = [(oID + m + 1, ['red', 'green', 'blue'][m % 3], 'mm_%s%05d' % (kind, i), ['%s%05d_mtl%02d_Vray' % (kind, i, m)]) 
+                    for m in xrange(min(mattes, idStep - 1))]
+            result.append((oID, assetName, assetPath, matteRecords))
+
+    return result
+
+
+def exportAsset(path, oID, assetName, assetPath, matteRecords) : 
+    """ write of doExport """
+    db.exportObject(path, oID, assetName, assetPath, 'bench', [a[0] for a in matteRecords], matteRecords)
+
+
+def viewerLoad(path) : 
+    """ load path of dbViewer, table filled page by page """
+    db.clearCache(path)
+    return len(list(db.iterTable(db.reader(path), 'ObjectID')))
+
+
+def viewerSelect(path, oID) : 
+    """ selection of one object in dbViewer """
+    conn = db.reader(path)
+    db.getObjectMatteIDs(conn, oID)
+    db.getObjectMattes(conn, oID).fetchall()
+
+
+def allocateAsset(path, assetName, lattice) : 
+    """ free oID lookup of the export ui, then booking on export """
+    db.findFreeObjectID(db.reader(path), *lattice)
+    db.allocateObjectID(path, assetName, '', 'bench', *lattice)
+
+
+def runSuite(assets=1000, mattes=8, propShare=0.5, lookups=1000, deleteShare=0.1, lattices=None) : 
+    """ time create_db operations on a synthetic project. return dict ready for json """
+    lattices = lattices or {'char': db.charIDRange, 'prop': db.propIDRange}
+    project = projectAssets(assets, mattes, propShare, lattices)
+    tmpDir = tempfile.mkdtemp()
+    path = os.path.join(tmpDir, 'vrayMatteID.db')
+    results = dict()
+
+    try : 
+        db.createTable(db.connect(path))
+
+        measure(results, 'export', exportAsset, [(path, ) + a for a in project])
+
+        db.clearCache(path)
+        measure(results, 'readDatabaseCold', db.readDatabaseFile, [(path, )])
+        measure(results, 'readDatabaseWarm', db.readDatabaseFile, [(path, )] * 100)
+
+        conn = db.reader(path)
+        picks = [random.choice(project) for i in xrange(lookups)]
+        measure(results, 'getObjectID', lambda a: db.getObjectID(conn, a).fetchall(), [(a[0], ) for a in picks])
+        measure(results, 'getAssetName', lambda a: db.getAssetName(conn, a).fetchall(), [(a[1], ) for a in picks])
+        measure(results, 'getMatteID', lambda a: db.getMatteID(conn, a).fetchall(), [(a[3][0][0], ) for a in picks if a[3]])
+        measure(results, 'getAssetNames', db.getAssetNames, [(conn, [a[1] for a in project])])
+
+        measure(results, 'viewerLoad', viewerLoad, [(path, )] * 10)
+        measure(results, 'viewerSelect', viewerSelect, [(path, a[0]) for a in picks])
+        # asset name typed in viewer search box, one search per key stroke 
+        measure(results, 'viewerSearch', db.searchAssets, [(conn, a[1][: i]) for a in picks[: 20] for i in xrange(1, len(a[1]) + 1)])
+
+        # delete a share of assets like from dbViewer, ten selected rows at a time, then book them again 
+        deleted = random.sample(project, int(len(project) * deleteShare))
+        measure(results, 'deleteAssets', db.deleteAssets, [(path, [b[0] for b in deleted[i: i + 10]]) for i in xrange(0, len(deleted), 10)])
+
+        kinds = [a[1][: 4] for a in deleted]
+        measure(results, 'allocateObjectID', allocateAsset, [(path, deleted[i][1], lattices[kinds[i]]) for i in xrange(len(deleted))])
+
+        measure(results, 'analyzeDatabase', db.analyzeDatabase, [(path, lattices.values())])
+        stats = db.databaseStats(db.connect(path))
+        db.disconnect()
+
+    finally : 
+        shutil.rmtree(tmpDir)
+
+    return {'date': time.strftime('%Y-%m-%d %H:%M:%S'), 
+            'python': sys.version.split()[0], 
+            'sqlite': db.sqlite3.sqlite_version, 
+            'schemaVersion': db.schemaVersion, 
+            'params': {'assets': assets, 'mattes': mattes, 'propShare': propShare, 'lookups': lookups, 
+                    'deleteShare': deleteShare, 'lattices': lattices}, 
+            'stats': stats, 
+            'results': results}
+
+
+def compareResults(base, result, threshold=1.2) : 
+    """ print mean time of each operation in two suite results. return operations slower by threshold """
+    slower = []
+
+    for name in sorted(result['results']) : 
+        if not name in base['results'] : 
+            continue
+
+        before = base['results'][name]['mean']
+        after = result['results'][name]['mean']
+        ratio = after / before if before else 0.0
+
+        if ratio > threshold : 
+            slower.append(name)
+
+        print '%-20s %12.1f us -> %12.1f us  x%.2f %s' % (name, before * 1e6, after * 1e6, ratio, 'SLOWER' if ratio > threshold else '')
+
+    return slower
+
+
+if __name__ == '__main__' :
+    rows = 100000
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'suite' : 
+        args = [int(a) for a in sys.argv[3:]]
+        result = runSuite(*args)
+
+        with open(sys.argv[2], 'w') as f : 
+            json.dump(result, f, indent=1, sort_keys=True)
+
+        for name in sorted(result['results']) : 
+            print '%-20s %6s x %12.1f us' % (name, result['results'][name]['count'], result['results'][name]['mean'] * 1e6)
+
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare' : 
+        files = [json.load(open(a)) for a in sys.argv[2: 4]]
+        sys.exit(1 if compareResults(*files) else 0)
+
+    if len(sys.argv) > 1 :
+        rows = int(sys.argv[1])
+
+    benchIndexes(rows)
+    benchPrepared()
+    # round trip and replica checks fail the run 
+    failed = []
+
+    if not benchSnapshot(rows)[-1] : 
+        failed.append('snapshot round trip')
+
+    failed += ['replica %s' % a for a, ok in sorted(benchReplica(rows)[-1].items()) if not ok]
+    benchFreeRange(rows)
+    benchAnalyze(rows)
+    stressTest(journal='wal')
+    stressTest(journal='delete')
+
+    if failed : 
+        print 'FAILED : %s' % ', '.join(failed)
+        sys.exit(1)
@@ -0,0 +1,168 @@
+'''
+local db service. one process per workstation owns the project dbs, so writes of all
+maya sessions are serialized here instead of by file locks over SMB. queued writes
+of a db are committed together in one transaction.
+
+sessions reach it through create_db.serviceCall, which uses the db file directly
+when the service is not running
+
+python db_service.py [host:port]
+
+protocol is one json object per line each way
+    {"op": "allocate", "path": "P:/Lego_X/.local/rsMatteID.db", "args": [...]}
+    {"result": 1020}  or  {"error": "database is locked", "type": "OperationalError"}
+'''
+
+#Import python modules
+import os, sys
+import json
+import Queue
+import SocketServer
+import threading
+import traceback
+
+moduleFile = sys.modules[__name__].__file__
+moduleDir = os.path.dirname(os.path.abspath(moduleFile))
+sys.path.append(moduleDir)
+
+import create_db as db
+
+# most writes committed in one transaction
+batchSize = 64
+
+
+class WriteQueue(object) :
+    """ writes of all clients, run one batch at a time by one thread """
+    def __init__(self) :
+        self.queue = Queue.Queue()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, op, path, args) :
+        """ queue write and wait for it. return its result, raise its error """
+        item = {'op': op, 'path': path, 'args': args, 'done': threading.Event()}
+        self.queue.put(item)
+        item['done'].wait()
+
+        if 'error' in item :
+            raise item['error']
+
+        return item['result']
+
+    def run(self) :
+        while True :
+            batch = [self.queue.get()]
+
+            # writes queued while the last batch was committed go in this one
+            while len(batch) < batchSize :
+                try :
+                    batch.append(self.queue.get_nowait())
+
+                except Queue.Empty :
+                    break
+
+            paths = []
+
+            for item in batch :
+                if not item['path'] in paths :
+                    paths.append(item['path'])
+
+            for path in paths :
+                self.runBatch(path, [a for a in batch if a['path'] == path])
+
+    def runBatch(self, path, items) :
+        """ commit items of one db together. if one fails all are rolled back and run one by one """
+        try :
+            if len(items) > 1 :
+                try :
+                    with db.transaction(path) :
+                        results = [db.serviceOps[a['op']](path, *a['args']) for a in items]
+
+                except Exception :
+                    print 'Batch of %s writes failed, run one by one' % len(items)
+
+                else :
+                    for item, result in zip(items, results) :
+                        item['result'] = result
+
+                    return
+
+            for item in items :
+                try :
+                    item['result'] = db.serviceOps[item['op']](path, *item['args'])
+
+                except Exception as e :
+                    item['error'] = e
+
+        finally :
+            for item in items :
+                item['done'].set()
+
+
+class ServiceHandler(SocketServer.StreamRequestHandler) :
+    """ requests of one client connection. reads run in this thread, writes in the write queue """
+    def handle(self) :
+        while True :
+            line = self.rfile.readline()
+
+            if not line :
+                break
+
+            try :
+                # strings back to str, so records are stored like the ones written directly
+                request = json.loads(line)
+                op, path, args = db.fromService([request['op'], request['path'], request['args']])
+
+                if not op in db.serviceOps :
+                    raise ValueError('Unknown op %s' % op)
+
+                if op in db.serviceWrites :
+                    result = self.server.writes.submit(op, path, args)
+
+                else :
+                    result = db.serviceOps[op](path, *args)
+
+                reply = {'result': result}
+
+            except Exception as e :
+                traceback.print_exc()
+                reply = {'error': str(e), 'type': e.__class__.__name__}
+
+            self.wfile.write(json.dumps(reply) + '\n')
+            self.wfile.flush()
+
+    def finish(self) :
+        SocketServer.StreamRequestHandler.finish(self)
+        # thread of this client ends here
+        db.disconnectThread()
+
+
+class Service(SocketServer.ThreadingMixIn, SocketServer.TCPServer) :
+    daemon_threads = True
+    allow_reuse_address = True
+    # sessions connecting at once, e.g. a farm of batch exports
+    request_queue_size = 64
+
+    def __init__(self, address) :
+        SocketServer.TCPServer.__init__(self, address, ServiceHandler)
+        self.writes = WriteQueue()
+
+
+def serve(address=None) :
+    """ run service at host:port until interrupted. default is create_db.serviceAddress """
+    address = address or db.serviceAddress
+    server = Service(db.parseAddress(address))
+    print 'DB service at %s' % address
+
+    try :
+        server.serve_forever()
+
+    except KeyboardInterrupt :
+        pass
+
+    server.server_close()
+
+
+if __name__ == '__main__' :
+    serve(*sys.argv[1: 2])
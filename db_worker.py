@@ -0,0 +1,174 @@
+'''
+background thread for db calls of the matte tools. apps submit requests
+and get results through signals, so a slow P: share does not freeze maya
+
+    self.dbService = db_worker.DbService(self)
+    self.dbService.request('readDb', self.onReadDb, hook.openDb, project)
+
+a request replaces the pending one of the same key, only the latest runs.
+result of a request is dropped if a newer one of the same key was submitted.
+requested functions run outside the Qt main thread, they must not touch ui or maya.
+writes pass an error callback too, to get their buttons back if they raise
+
+    self.dbService.request('export', self.onExport, exportAsset, ..., failed=self.onExportFailed)
+'''
+
+#Import python modules
+import traceback
+
+#Import GUI
+from PySide import QtCore
+
+from tool.matte import create_db as db
+reload(db)
+
+
+class Worker(QtCore.QThread) :
+    """ runs submitted db calls one by one in its own thread """
+    done = QtCore.Signal(str, int, object)
+    failed = QtCore.Signal(str, int, str)
+
+    def __init__(self, parent=None) :
+        super(Worker, self).__init__(parent)
+        self.mutex = QtCore.QMutex()
+        self.condition = QtCore.QWaitCondition()
+        self.pending = dict()
+        self.order = []
+        self.generations = dict()
+        self.running = True
+
+    def submit(self, key, func, args=(), kwargs=None) :
+        """ queue func(*args, **kwargs) under key, replacing a pending request of key. return its generation """
+        self.mutex.lock()
+
+        try :
+            generation = self.generations.get(key, 0) + 1
+            self.generations[key] = generation
+            self.pending[key] = (generation, func, args, kwargs or dict())
+
+            # replaced request keeps its place in the queue
+            if not key in self.order :
+                self.order.append(key)
+
+            self.condition.wakeOne()
+
+        finally :
+            self.mutex.unlock()
+
+        return generation
+
+    def run(self) :
+        while True :
+            self.mutex.lock()
+
+            try :
+                while self.running and not self.order :
+                    self.condition.wait(self.mutex)
+
+                if not self.running :
+                    break
+
+                key = self.order.pop(0)
+                generation, func, args, kwargs = self.pending.pop(key)
+
+            finally :
+                self.mutex.unlock()
+
+            try :
+                result = func(*args, **kwargs)
+
+            except Exception :
+                self.failed.emit(key, generation, traceback.format_exc())
+                continue
+
+            self.done.emit(key, generation, result)
+
+        # connections of this thread can not be closed from another one
+        db.disconnectThread()
+
+    def stop(self) :
+        """ finish current request and end thread """
+        self.mutex.lock()
+        self.running = False
+        self.condition.wakeOne()
+        self.mutex.unlock()
+        self.wait()
+
+
+# one db thread for all tools, kept across reload so it is never destroyed while running
+try :
+    _worker
+except NameError :
+    _worker = None
+
+
+def worker() :
+    """ shared worker thread, started on first use """
+    global _worker
+
+    if _worker is None :
+        _worker = Worker()
+        _worker.start()
+
+        app = QtCore.QCoreApplication.instance()
+
+        if app :
+            app.aboutToQuit.connect(_worker.stop)
+
+    return _worker
+
+
+class DbService(QtCore.QObject) :
+    """ db requests of one window. callbacks run in the Qt main thread """
+    def __init__(self, parent=None) :
+        super(DbService, self).__init__(parent)
+        self.worker = worker()
+        self.callbacks = dict()
+        self.errorCallbacks = dict()
+
+        # receiver lives in main thread, so results are queued to it
+        self.worker.done.connect(self.onDone)
+        self.worker.failed.connect(self.onFailed)
+
+    def key(self, name) :
+        """ request key of this window in the shared worker """
+        return '%s.%s' % (id(self), name)
+
+    def request(self, name, callback, func, *args, **kwargs) :
+        """ run func(*args, **kwargs) in worker, then callback(result). a pending request of name is replaced.
+            keyword failed is not passed to func, failed(message) runs instead of callback if func raises
+        """
+        key = self.key(name)
+        failed = kwargs.pop('failed', None)
+        generation = self.worker.submit(key, func, args, kwargs)
+        self.callbacks[key] = (generation, callback)
+        self.errorCallbacks[key] = failed
+
+        return generation
+
+    def isPending(self, name) :
+        return self.key(name) in self.callbacks
+
+    @QtCore.Slot(str, int, object)
+    def onDone(self, key, generation, result) :
+        entry = self.callbacks.get(key)
+
+        # other window, or a newer request of key will deliver
+        if not entry or not entry[0] == generation :
+            return
+
+        del self.callbacks[key]
+        entry[1](result)
+
+    @QtCore.Slot(str, int, str)
+    def onFailed(self, key, generation, message) :
+        entry = self.callbacks.get(key)
+
+        if not entry or not entry[0] == generation :
+            return
+
+        del self.callbacks[key]
+        print 'DB request %s failed\n%s' % (key.split('.', 1)[1], message)
+
+        if self.errorCallbacks.get(key) :
+            self.errorCallbacks[key](message)
@@ -8,7 +8,6 @@ v.1.2 add update matte ID
 
 #Import python modules
 import os, sys
-import sqlite3
 from collections import Counter
 
 #Import GUI
@@ -37,6 +36,8 @@ reload(presets)
 reload(customWidget)
 from tool.matte import redshift_hook as hook
 reload(hook)
+from tool.matte import db_worker
+reload(db_worker)
 
 moduleFile = sys.modules[__name__].__file__
 moduleDir = os.path.dirname(moduleFile)
@@ -142,6 +143,12 @@ class MyForm(QtGui.QMainWindow):
 
         self.colorMap = {'red': [100, 0, 0], 'green': [0, 100, 0], 'blue': [0, 0, 100], None: [0, 0, 0]}
 
+        # project db, objectID and matte records of the table are read by dbService 
+        self.dbService = db_worker.DbService(self)
+        self.booked = False
+        self.matteIDKey = dict()
+        self.mtlLoaded = False
+
         self.initFunctions()
         self.initSignals()
 
@@ -181,8 +188,22 @@ class MyForm(QtGui.QMainWindow):
         # dbResult = db.readDatabase(project, dbName='rsMatteID')
 
         # self.dbData = dbResult
-        self.dbData, dbPath = hook.readDb(project)
+        # offline exports are merged before onReadDb reads objectID of the asset 
+        self.dbService.request('readDb', self.onReadDb, openProjectDb, project)
+
+    def onReadDb(self, result) : 
+        dbPath, merged, conflicts = result
         self.ui.db_lineEdit.setText(dbPath)
+        self.showMerge(merged, conflicts)
+        self.setObjectID()
+
+    def showMerge(self, merged, conflicts) : 
+        for entry in merged : 
+            trace('Merge offline export %s %s' % (entry['oID'], entry['assetName']))
+
+        if conflicts : 
+            message = '\n'.join(['%s %s : %s' % (entry['oID'], entry['assetName'], reason) for entry, reason in conflicts])
+            self.messageBox('Warning', 'Offline exports not merged, please export again\n%s' % message)
 
     def setUI(self) : 
         self.customUI()
@@ -193,18 +214,15 @@ class MyForm(QtGui.QMainWindow):
         self.setMode()
         self.setPresetFiles()
         self.setPresetData()
-        self.setObjectID()
-        self.setMtlUI()
-        self.setPresets()
+        # objectID, material table and presets are filled once db is open (onReadDb)
 
 
     def refreshUI(self) : 
         self.setMode()
         self.setPresetFiles()
         self.setPresetData()
+        # material table and presets follow objectID 
         self.setObjectID()
-        self.setMtlUI()
-        self.setPresets()
 
 
 
@@ -232,8 +250,6 @@ class MyForm(QtGui.QMainWindow):
     def presetComboBoxAction(self) : 
         self.setPresetData()
         self.setObjectID()
-        self.setMtlUI()
-        self.setPresets()
 
     def changeResDb(self): 
 
@@ -303,77 +319,47 @@ class MyForm(QtGui.QMainWindow):
 
     def setObjectID(self) : 
         # read database 
+        dbPath = str(self.ui.db_lineEdit.text())
+
+        # db not open yet, onReadDb calls again 
+        if not dbPath : 
+            return 
+
         assetName = str(self.ui.assetName_label.text())
-        assetNameDb = self.getDbData(self.assetNameCol)
+        idStart, idRange, idStep = self.getIDRange()
+        self.dbService.request('objectID', self.onObjectID, fetchObjectID, dbPath, assetName, idStart, idRange, idStep)
+
+    def onObjectID(self, result) : 
+        oID, booked = result
+        self.booked = booked
+        self.ui.id_label.setText(str(oID))
+        self.ui.reassign_pushButton.setVisible(booked)
 
-        if assetName in assetNameDb : 
-            assetInfo = self.getAssetNameDb(assetName)
-            assetOID = assetInfo[0][self.oIDCol]
+        if booked : 
             self.setStatus('booked')
-            self.ui.id_label.setText(str(assetOID))
-            self.ui.reassign_pushButton.setVisible(True)
 
         else : 
             # read existing 
-            dbPath = str(self.ui.db_lineEdit.text())
-            avId = self.getAvailableID()
-            self.ui.id_label.setText(str(avId))
             self.setStatus('ready')
-            self.ui.reassign_pushButton.setVisible(False)
-
+            idStep = self.getIDRange()[2]
+            self.matteIds = [a for a in xrange((oID + 1), (oID + idStep), 1)]
 
-    def getAvailableID(self) : 
-        """ find availble ID """
-
-        # connect to db 
-        dbPath = str(self.ui.db_lineEdit.text())
-        conn = sqlite3.connect(dbPath)
-        data = db.queryObjectIDTable(conn)
-
-        exIds = []
+        # matteIDs of presets depend on objectID 
+        self.setMtlUI()
 
-        # find existing ID 
-        for each in data : 
-            exIds.append(each[1])
 
-        # get ID range 
+    def getIDRange(self) : 
+        """ oID lattice of current mode """
         if self.charPreset : 
-            idStart = self.objectIDStart
-            idRange = self.objectIDRange
-            idStep = self.objectIDStep
+            return self.objectIDStart, self.objectIDRange, self.objectIDStep
 
         if self.propPreset : 
-            idStart = self.propIDStart
-            idRange = self.propIDRange
-            idStep = self.propIDStep
-
-        print idStart
-        print idRange
-        print idStep
-
-
-        allIds = [a for a in xrange(idStart, idRange, idStep)]
-        avIds = [a for a in allIds if not a in exIds]
-        self.avIds = avIds
-        pickId = avIds[0]
-        self.matteIds = [a for a in xrange((pickId + 1), (pickId + idStep), 1)]
-
-        return pickId
-
-
-    def getDbData(self, col) : 
-        return [a[col] for a in self.dbData]
-
-    def getAssetNameDb(self, assetName) : 
-        dbPath = str(self.ui.db_lineEdit.text())
-        conn = sqlite3.connect(dbPath)
-        result = db.getAssetName(conn, assetName)
-        assetNames = [a for a in result]
-        conn.close()
+            return self.propIDStart, self.propIDRange, self.propIDStep
 
-        return assetNames
 
     def projectAction(self) : 
+        # drop connection of previous project before switching db 
+        db.disconnect(str(self.ui.db_lineEdit.text()))
         self.readDb()
 
 
@@ -388,7 +374,17 @@ class MyForm(QtGui.QMainWindow):
 
 
     def setMtlUI(self) : 
+        """ list scene materials, then fill table once their db keys are read """
         vrayMtls = self.listMtlNode()
+        dbPath = str(self.ui.db_lineEdit.text())
+        fill = lambda matteKeys : self.fillMtlTable(vrayMtls, matteKeys)
+
+        # table is stale until keys of the new request are read 
+        self.mtlLoaded = False
+        self.dbService.request('matteKeys', fill, fetchMatteKeys, dbPath, vrayMtls.values())
+
+
+    def fillMtlTable(self, vrayMtls, matteKeys) : 
         row = 0 
         height = 20 
         widget = 'tableWidget'
@@ -434,12 +430,13 @@ class MyForm(QtGui.QMainWindow):
             #     statusColor = self.blue
 
             # use this line instead. to find key ID of matteID
-            midKey = self.checkmID(mID)
+            # keys of all materials are read in one query (fetchMatteKeys)
+            midKey = matteKeys.get(mID)
 
             if midKey : 
                 status = self.inDb
                 statusColor = self.blue
-                self.matteIDKey.update({mID: midKey[0]})
+                self.matteIDKey.update({mID: midKey})
 
             else : 
                 statusColor = self.green
@@ -490,6 +487,8 @@ class MyForm(QtGui.QMainWindow):
         # self.ui.tableWidget.resizeColumnToContents(self.vrayMtlCol)
         # self.ui.tableWidget.resizeColumnToContents(self.oID2Col)
         self.ui.tableWidget.resizeColumnToContents(self.tagCol)
+        self.mtlLoaded = True
+        self.setPresets()
 
 
     def listMtlNode(self) : 
@@ -637,11 +636,25 @@ class MyForm(QtGui.QMainWindow):
         """ export to database """ 
         trace('-------  Start Export --------')
 
-        # get data 
-        dbPath = str(self.ui.db_lineEdit.text())
-        conn = sqlite3.connect(dbPath)
+        # table is refilled when pending queries finish, export what user will see 
+        if [a for a in ['readDb', 'objectID', 'matteKeys'] if self.dbService.isPending(a)] : 
+            self.messageBox('Warning', 'Database is still loading, please export again')
+            return 
+
+        # keys of materials were not read, e.g. their request failed. table has no mattes to export 
+        if not self.mtlLoaded : 
+            self.messageBox('Warning', 'Materials are not read from Database, please select project again')
+            return 
+
+        # get data. share down or db not opened, export goes to offline journal (exportAsset). 
+        # path of db not opened is resolved without touching the share 
+        dbPath = str(self.ui.db_lineEdit.text()) or hook.dbPath(str(self.ui.project_comboBox.currentText()))
 
         # get objectID data 
+        if not str(self.ui.id_label.text()).isdigit() : 
+            self.messageBox('Warning', 'No ID read from Database, please select project again')
+            return 
+
         oId = int(str(self.ui.id_label.text()))
         assetName = str(self.ui.assetName_label.text())
         assetPath = self.asset.getPath('ref')
@@ -654,33 +667,20 @@ class MyForm(QtGui.QMainWindow):
         vrayMtls = self.getAllData(self.vrayMtlCol, 'tableWidget')
         colors = self.getAllData(self.colorCol, 'tableWidget')
 
-        # check if objectID exists in DB 
-        dbOId = self.getAllDbOId()
-
-        idKey = self.checkoID(oId)
+        # booking state of last refresh. oID and mID are unique in db, records are written 
+        # in one pass without checking for them again. a booking made since is caught by exportAsset 
+        idKey = self.booked
 
-        # assign objectID to Rig_Grp
-        self.assignObjectID()
+        if idKey and not self.ui.update_checkBox.isChecked() : 
+            # assign objectID to Rig_Grp
+            self.assignObjectID()
+            self.messageBox('Warning', 'ID %s exists in Database' % oId)
+            return 
 
         # filter mIDs 
         validMIDs = [int(mIDs[i]) for i in range(len(mIDs)) if statuses[i] == self.readyStatus or statuses[i] == self.extraPresetStatus]
         validMIDs = sorted(list(set(validMIDs)))
 
-        if not idKey : 
-            # add objectID to database 
-            db.addObjectIDValue(conn, oId, assetName, assetPath, user, str(validMIDs))
-
-        elif self.ui.update_checkBox.isChecked() : 
-            validMIDs = [int(mIDs[i]) for i in range(len(mIDs)) if statuses[i] == self.readyStatus or statuses[i] == self.extraPresetStatus or statuses[i] == self.inDb]
-            validMIDs = sorted(list(set(validMIDs)))
-            db.updateObjectIDValue(conn, idKey[0], oId, assetName, assetPath, user, str(validMIDs))
-
-        else : 
-            self.messageBox('Warning', 'ID %s exists in Database' % oId)
-            return 
-
-        trace('Add %s %s %s %s %s to database' % (oId, assetName, assetPath, user, str(mIDs)))
-
         tmpDict = dict()
         for i in range(len(mIDs)) : 
             mID = mIDs[i]
@@ -695,34 +695,31 @@ class MyForm(QtGui.QMainWindow):
             else : 
                 tmpDict[mID]['vrayMtl'].append(vrayMtl)
 
+        if idKey : 
+            validMIDs = [int(mIDs[i]) for i in range(len(mIDs)) if statuses[i] == self.readyStatus or statuses[i] == self.extraPresetStatus or statuses[i] == self.inDb]
+            validMIDs = sorted(list(set(validMIDs)))
+
+        matteRecords = []
 
-        for each in tmpDict.keys() : 
+        for each in sorted(tmpDict.keys()) : 
             mID = each 
             status = tmpDict[each]['status']
             color = tmpDict[each]['color']
             multiMatte = tmpDict[each]['mm']
             vrayMtl = tmpDict[each]['vrayMtl']
 
-            if status == self.readyStatus : 
-                db.addMatteIDValue(conn, mID, color, multiMatte, str(vrayMtl))
+            if status == self.readyStatus or status == self.inDb : 
+                matteRecords.append((mID, color, multiMatte, vrayMtl))
                 trace('Write %s %s %s %s to Database' % (mID, color, multiMatte, vrayMtl))
 
-            elif status == self.inDb : 
-                midKey = self.matteIDKey[int(mID)]
-                db.updateMatteIDValue(conn, midKey, mID, color, multiMatte, str(vrayMtl))
-                trace('Update %s %s %s %s to Database' % (mID, color, multiMatte, vrayMtl))
-
             else : 
                 trace('Not export to Databse! %s %s %s %s to Database' % (mID, color, multiMatte, vrayMtl))
 
-
-        conn.commit()
-
-        self.readDb()
-        self.setObjectID()
-        self.setMtlUI()
-        trace('Export complete')
-        self.messageBox('Success', 'Export ID %s to Database complete' % oId)
+        # merge, booking and write run in db thread, buttons are back once onExport has the result 
+        self.setBusy(True)
+        done = lambda result : self.onExport(oId, assetName, result)
+        self.dbService.request('export', done, exportAsset, dbPath, oId, assetName, assetPath, user, 
+                idKey, self.getIDRange(), validMIDs, matteRecords, failed=self.onExportFailed)
 
         # else : 
         #     # if self.ui.update_checkBox.isChecked() : 
@@ -730,7 +727,51 @@ class MyForm(QtGui.QMainWindow):
 
         #     self.messageBox('Warning', 'ID %s exists in Database' % oId)
 
-        conn.close()
+    def onExport(self, oId, assetName, result) : 
+        status, value, merged, conflicts = result
+        self.setBusy(False)
+        self.showMerge(merged, conflicts)
+
+        if status == 'full' : 
+            idStart, idRange, idStep = value
+            self.messageBox('Warning', 'No free ID left in range %s - %s' % (idStart, idRange))
+            return 
+
+        if status == 'taken' : 
+            self.readDb()
+            self.refreshUI()
+            self.messageBox('Warning', 'ID %s is already taken. %s is booked as ID %s, please assign mattes again' % (oId, assetName, value))
+            return 
+
+        if status == 'conflict' : 
+            # booking of last refresh is stale, ID or asset was booked by another export since 
+            self.readDb()
+            self.messageBox('Warning', 'ID %s was not exported, %s. Please assign mattes again' % (oId, value))
+            return 
+
+        # assign objectID to Rig_Grp
+        self.assignObjectID()
+
+        if status == 'journal' : 
+            trace('Add %s %s to offline journal %s' % (oId, assetName, value))
+            self.messageBox('Warning', 'Database is not reachable. Export ID %s is kept in %s and written to Database on next export' % (oId, value))
+            return 
+
+        trace('Add %s %s to database' % (oId, assetName))
+
+        # objectID and material table are refreshed from readDb 
+        self.readDb()
+        trace('Export complete')
+        self.messageBox('Success', 'Export ID %s to Database complete' % oId)
+
+    def onExportFailed(self, message) : 
+        self.setBusy(False)
+        self.messageBox('Error', 'Export failed\n%s' % message.strip().splitlines()[-1])
+
+    def setBusy(self, busy) : 
+        """ export and reassign buttons are off while their db request runs """
+        self.ui.export_pushButton.setEnabled(not busy)
+        self.ui.reassign_pushButton.setEnabled(not busy)
 
 
     def doAssign(self) : 
@@ -747,7 +788,6 @@ class MyForm(QtGui.QMainWindow):
             result = self.setID(mtrs[0], mID)
 
             self.setMtlUI()
-            self.setPresets()
 
 
     def autoAssign(self) : 
@@ -770,7 +810,6 @@ class MyForm(QtGui.QMainWindow):
                         matchs.append(mtrName)
 
             self.setMtlUI()
-            self.setPresets()
 
         if not matchs : 
             self.messageBox('Information', 'No material match preset')
@@ -778,33 +817,30 @@ class MyForm(QtGui.QMainWindow):
 
     def reAssignID(self) : 
         objID = int(str(self.ui.id_label.text()))
-        record = self.getOID(objID)
-        print record
 
-        mtls = [a for a in self.listMtlNode()]
-        
-        if len(record) == 1 : 
-            mIDs = eval(record[0][5])
-            print 'mIDs', mIDs
-            
-            for mID in mIDs : 
-                mtls = eval(self.getMID(mID)[0][4])
+        # (material, mID) exported with this object, one indexed query 
+        self.setBusy(True)
+        self.dbService.request('reassign', self.onReAssignID, fetchMaterialMattes, str(self.ui.db_lineEdit.text()), objID, 
+                failed=lambda message : self.setBusy(False))
 
-                for mtl in mtls : 
-                    if mtl in mtls : 
-                        vrayAttr = hook.matteIDAttr(mtl)
-                        self.setID(mtl, mID)
-                        print vrayAttr, mID
+    def onReAssignID(self, materialMattes) : 
+        self.setBusy(False)
+        sceneMtls = self.listMtlNode()
+        assignments = []
 
-                    else : 
-                        print '%s skipped' % vrayMtl
+        for mtl, mID in materialMattes : 
+            if mtl in sceneMtls : 
+                assignments.append((mtl, mID))
 
+            else : 
+                print '%s skipped' % mtl
 
+        self.setIDs(assignments)
         self.refreshUI()
 
 
     def checkMatteIDRecord(self, matteIds) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
+        conn = db.reader(str(self.ui.db_lineEdit.text()))
 
         result = db.getAllMID(conn)
         rMatteIDs = [a[0] for a in result]
@@ -822,96 +858,39 @@ class MyForm(QtGui.QMainWindow):
                 for each in result : 
                     print each
 
-        conn.close()
-
         return allow
 
 
     def getAllDbMatteID(self) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
+        conn = db.reader(str(self.ui.db_lineEdit.text()))
         result = db.getAllMID(conn)
         ids = []
 
         for each in result : 
             ids.append(each[0])
 
-        conn.close()
-
         return ids
 
 
     def getAllDbOId(self) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
+        conn = db.reader(str(self.ui.db_lineEdit.text()))
         result = db.getAllOID(conn)
         ids = []
         
         for each in result : 
             ids.append(each[0])
 
-        conn.close()
-
         return ids
 
 
-    def checkoID(self, oID) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
-        result = db.getObjectID(conn, oID)
-        ids = []
-        
-        for each in result : 
-            ids.append(each[0])
-
-        conn.close()
-
-        return ids
-
-    def checkmID(self, mID) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
-        result = db.getMatteID(conn, mID)
-        ids = []
-        
-        for each in result : 
-            ids.append(each[0])
-
-        conn.close()
-
-        return ids
-
-    def getOID(self, oID) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
-        result = db.getObjectID(conn, oID)
-        record = []
-        
-        for each in result : 
-            record.append(each)
-
-        conn.close()
-
-        return record
-
-
-    def getMID(self, mID) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
-        result = db.getMatteID(conn, mID)
-        record = []
-        
-        for each in result : 
-            record.append(each)
-
-        conn.close()
-
-        return record
-
     def getAllDbMId(self) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
+        conn = db.reader(str(self.ui.db_lineEdit.text()))
         result = db.getAllOID(conn)
         ids = []
         
         for each in result : 
             ids.append(each[0])
 
-        conn.close()
-
         return ids
 
 
@@ -944,6 +923,24 @@ class MyForm(QtGui.QMainWindow):
         mc.setAttr(attr, value)
 
 
+    def setIDs(self, assignments) : 
+        """ setID of [(material, mID)] as one undo step. materials already on their mID are skipped """
+        mc.undoInfo(openChunk = True)
+
+        try : 
+            for material, mID in assignments : 
+                attr = hook.matteIDAttr(material)
+
+                if mc.objExists(attr) and mc.getAttr(attr) == mID : 
+                    continue
+
+                self.setID(material, mID)
+                print attr, mID
+
+        finally : 
+            mc.undoInfo(closeChunk = True)
+
+
     def runDBView(self) : 
         from tool.matte import dbViewer_app as app
         reload(app)
@@ -1130,6 +1127,107 @@ class MyForm(QtGui.QMainWindow):
 
 
 
+# requests of readDb, setObjectID, setMtlUI, doExport and reAssignID 
+
+def openProjectDb(project) : 
+    """ open db of project and merge offline exports. return (dbPath, merged, conflicts) """
+    try : 
+        dbPath = hook.openDb(project)
+
+    except (IOError, OSError, db.sqlite3.OperationalError) : 
+        # share down, ids are read from offline journal until it is back 
+        dbPath = hook.dbPath(project)
+
+        if not db.isOffline(dbPath) : 
+            raise 
+
+        return dbPath, [], []
+
+    if not db.pendingExports(dbPath) : 
+        return dbPath, [], []
+
+    merged, conflicts = db.replayJournal(dbPath)
+
+    return dbPath, merged, conflicts
+
+
+def exportAsset(dbPath, oID, assetName, assetPath, user, booked, idRange, mIDs, matteRecords) : 
+    """ merge offline exports, book oID if asset is not booked yet and write its records. 
+        return (status, value, merged, conflicts). status is 'done', 'full' with the id range if 
+        no oID of it is free, 'taken' with the oID asset got instead, 'conflict' with its reason or 'journal' with 
+        the journal file if share is down 
+    """
+    merged, conflicts = [], []
+
+    if not db.isOffline(dbPath) : 
+        try : 
+            if db.pendingExports(dbPath) : 
+                merged, conflicts = db.replayJournal(dbPath)
+
+            if not booked : 
+                # book ID under db lock, another artist may have taken it since UI refresh 
+                bookedId = db.serviceAllocate(dbPath, assetName, assetPath, user, *idRange)
+
+                if bookedId is None : 
+                    return 'full', idRange, merged, conflicts
+
+                if bookedId != oID : 
+                    return 'taken', bookedId, merged, conflicts
+
+            # write all records in one transaction, nothing is written if any of them fails. 
+            # goes through local db service if it is running 
+            try : 
+                db.serviceExport(dbPath, oID, assetName, assetPath, user, mIDs, matteRecords)
+
+            except db.sqlite3.IntegrityError as e : 
+                return 'conflict', str(e), merged, conflicts
+
+            return 'done', None, merged, conflicts
+
+        except db.sqlite3.OperationalError : 
+            # share dropped since UI refresh or during export 
+            if not db.isOffline(dbPath) : 
+                raise 
+
+    journal = db.journalExport(dbPath, oID, assetName, assetPath, user, mIDs, matteRecords, update=booked)
+
+    return 'journal', journal, merged, conflicts
+
+
+def fetchObjectID(dbPath, assetName, idStart, idRange, idStep) : 
+    """ (oID, booked) of assetName. first free oID of range if asset is not booked """
+    if db.isOffline(dbPath) : 
+        return db.offlineObjectID(dbPath, assetName, idStart, idRange, idStep)
+
+    return db.serviceFindObjectID(dbPath, assetName, idStart, idRange, idStep)
+
+
+def fetchMaterialMattes(dbPath, oID) : 
+    """ [(material, mID)] exported with object """
+    return db.getMaterialMattes(db.reader(dbPath), oID)
+
+
+def fetchMatteKeys(dbPath, mIDs) : 
+    """ {mID: record ID} of mIDs found in db. read from local replica while share is down """
+    mIDs = [int(a) for a in mIDs]
+
+    try : 
+        if db.isOffline(dbPath) : 
+            records = db.offlineLookup(dbPath, 'MatteID', 'mID', mIDs)
+
+        else : 
+            records = db.serviceLookup(dbPath, 'MatteID', 'mID', mIDs)
+
+    except db.sqlite3.OperationalError : 
+        # share dropped since isOffline 
+        if not db.isOffline(dbPath) : 
+            raise 
+
+        records = db.offlineLookup(dbPath, 'MatteID', 'mID', mIDs)
+
+    return dict([(mID, records[mID][0]) for mID in records])
+
+
 def deleteUI(ui) : 
     if mc.window(ui, exists = True) : 
         mc.deleteUI(ui)
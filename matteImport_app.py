@@ -1,6 +1,5 @@
 #Import python modules
 import os, sys
-import sqlite3
 from collections import Counter
 
 #Import GUI
@@ -28,6 +27,8 @@ reload(db)
 from tool.matte import presets, customWidget
 reload(presets)
 reload(customWidget)
+from tool.matte import db_worker
+reload(db_worker)
 
 moduleFile = sys.modules[__name__].__file__
 moduleDir = os.path.dirname(moduleFile)
@@ -117,6 +118,9 @@ class MyForm(QtGui.QMainWindow):
         self.blue = [20, 40, 100]
         self.lightGreen = [40, 100, 0]
 
+        # records of scene assets are read by dbService when the asset list is filled 
+        self.dbService = db_worker.DbService(self)
+
         self.initFunctions()
         self.initSignals()
 
@@ -139,16 +143,17 @@ class MyForm(QtGui.QMainWindow):
 
     def readDb(self) : 
         project = str(self.ui.project_comboBox.currentText())
-        dbResult = db.readDatabase(project)
-        self.ui.db_lineEdit.setText(db.dbPath(project))
+        # only the db path is kept, onReadDb reads records of the scene assets 
+        self.dbService.request('readDb', self.onReadDb, db.openDatabase, project)
 
-        self.dbData = dbResult
+    def onReadDb(self, dbPath) : 
+        self.ui.db_lineEdit.setText(dbPath)
+        self.setAssetListUI()
 
     def setUI(self) : 
         self.setLogo()
         self.setProject()
-        self.setAssetListUI()
-        self.checkStatus()
+        # asset list and status are filled once db is open (onReadDb)
 
 
     def refreshUI(self) : 
@@ -181,22 +186,10 @@ class MyForm(QtGui.QMainWindow):
             self.readDb()
 
 
-    def getDbData(self, col) : 
-        return [a[col] for a in self.dbData]
-
-    def getAssetNameDb(self, assetName) : 
-        dbPath = str(self.ui.db_lineEdit.text())
-        conn = sqlite3.connect(dbPath)
-        result = db.getAssetName(conn, assetName)
-        assetNames = [a for a in result]
-        conn.close()
-
-        return assetNames
-
     def projectAction(self) : 
+        # drop connection of previous project before switching db 
+        db.disconnect(str(self.ui.db_lineEdit.text()))
         self.readDb()
-        self.setAssetListUI()
-        self.checkStatus()
 
 
     def setStatus(self, status) : 
@@ -210,10 +203,25 @@ class MyForm(QtGui.QMainWindow):
 
 
     def setAssetListUI(self) : 
+        """ list scene assets, then fill table once their records are read """
+        dbPath = str(self.ui.db_lineEdit.text())
+
+        # db not open yet, onReadDb calls again 
+        if not dbPath : 
+            return 
+
+        assets = self.listSceneAssets()
+        fill = lambda dbData : self.fillAssetList(assets, dbData)
+
+        self.dbService.request('assetList', fill, fetchAssetData, dbPath, [a[0] for a in assets if a[0]])
+
+
+    def fillAssetList(self, assets, dbData) : 
+        records, objectMattes, matteRecords = dbData
         row = 0 
         height = 20 
         widget = 'tableWidget'
-        assetInfo = self.getAssetInfo()
+        assetInfo = self.buildAssetInfo(assets, records)
         self.clearTable(widget)
 
         for eachItem in sorted(assetInfo.keys()) : 
@@ -250,38 +258,56 @@ class MyForm(QtGui.QMainWindow):
         self.ui.tableWidget.resizeColumnToContents(self.mIDsCol)
         self.ui.tableWidget.resizeColumnToContents(self.assetCol)
 
+        self.checkStatus(assetInfo, objectMattes, matteRecords)
+
 
 
     def getAssetInfo(self) : 
+        assets = self.listSceneAssets()
+
+        # read records of all assets at once 
+        records = self.getObjectIDRecords([a[0] for a in assets if a[0]])
+
+        return self.buildAssetInfo(assets, records)
+
+
+    def listSceneAssets(self) : 
+        """ [(assetName, assetPath)] of referenced assets """
         # list asset from reference
         refs = mc.file(q = True, r = True)
-        rigGrp = mc.ls('*:Rig_Grp')
-
-        assetInfo = dict()
+        assets = []
 
         for eachRef in refs : 
             if pipelineTools.checkPipelinePath(eachRef, mode = 'asset') : 
                 asset = entityInfo.info(eachRef)
-                assetName = asset.name()
-                assetPath = asset.getPath('ref')
-                record = self.getObjectIDRecord(assetName)
-                
-                if assetName and record : 
-                    oID = record[1]
-                    dbAssetName = record[2]
-                    dbAssetPath = record[3]
-                    dbUser = record[4]
-                    dbMatteRange = record[5]
+                assets.append((asset.name(), asset.getPath('ref')))
 
-                    if not assetName in assetInfo.keys() : 
-                        assetInfo.update({assetName: {'db': True, 'oID': oID, 'assetName': dbAssetName, 'assetPath': dbAssetPath, 'user': dbUser, 'matteIDs': dbMatteRange, 'No': 1}})
+        return assets
 
-                    else : 
-                        assetInfo[assetName]['No'] += 1
+
+    def buildAssetInfo(self, assets, records) : 
+        """ table info of assets from their {assetName: record} """
+        assetInfo = dict()
+
+        for assetName, assetPath in assets : 
+            record = records.get(assetName)
+
+            if assetName and record : 
+                oID = record[1]
+                dbAssetName = record[2]
+                dbAssetPath = record[3]
+                dbUser = record[4]
+                dbMatteRange = record[5]
+
+                if not assetName in assetInfo.keys() : 
+                    assetInfo.update({assetName: {'db': True, 'oID': oID, 'assetName': dbAssetName, 'assetPath': dbAssetPath, 'user': dbUser, 'matteIDs': dbMatteRange, 'No': 1}})
 
                 else : 
-                    if not assetName in assetInfo.keys() : 
-                        assetInfo.update({assetName: {'db': False, 'oID': None, 'assetName': assetName, 'assetPath': assetPath, 'user': None, 'matteIDs': None, 'No': 1}})
+                    assetInfo[assetName]['No'] += 1
+
+            else : 
+                if not assetName in assetInfo.keys() : 
+                    assetInfo.update({assetName: {'db': False, 'oID': None, 'assetName': assetName, 'assetPath': assetPath, 'user': None, 'matteIDs': None, 'No': 1}})
 
 
         return assetInfo
@@ -410,9 +436,9 @@ class MyForm(QtGui.QMainWindow):
         return True
 
 
-    def checkStatus(self) : 
+    def checkStatus(self, assetInfo=None, objectMattes=None, records=None) : 
 
-        info = self.checkMultiMatte()
+        info = self.checkMultiMatte(assetInfo, objectMattes, records)
 
         for eachAsset in info : 
             mms = info[eachAsset]['info']
@@ -426,14 +452,21 @@ class MyForm(QtGui.QMainWindow):
             #     print mm
 
 
-    def checkMultiMatte(self) : 
+    def checkMultiMatte(self, assetInfo=None, objectMattes=None, records=None) : 
+        """ multiMatte info of assets. db records are read here unless given (fetchAssetData) """
         assets = self.getAllData(self.assetCol, 'tableWidget')
         selMID = self.getAllData(self.mIDsCol, 'tableWidget')
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
         oIDs = self.getAllData(self.oIDCol, 'tableWidget')
         statuses = self.getAllData(self.statusCol, 'tableWidget')
 
-        assetInfo = self.getAssetInfo()
+        if assetInfo is None : 
+            conn = db.reader(str(self.ui.db_lineEdit.text()))
+            assetInfo = self.getAssetInfo()
+
+            # mIDs of all assets and their matte records in two queries 
+            oIDs = [assetInfo[a]['oID'] for a in assetInfo if assetInfo[a]['db']]
+            objectMattes = db.getMatteIDsOfObjects(conn, oIDs)
+            records = db.getMatteIDs(conn, [a for mIDs in objectMattes.values() for a in mIDs])
 
         info = dict()
 
@@ -445,18 +478,18 @@ class MyForm(QtGui.QMainWindow):
                 mIDs = assetInfo[each]['matteIDs']
                 oID = assetInfo[each]['oID']
                 omm = 'mm_%s' % ommName
-                db = assetInfo[each]['db']
+                inDb = assetInfo[each]['db']
                 mmExists = mc.objExists(omm)
                 status = True
 
-                if db : 
+                if inDb : 
                     tmpDict.update({omm: {'color': {'red': oID}, 'exists': mmExists, 'materialId': False}})
                     # vr.assignMultiMatte(omm,'red', int(oID), materialId = False)
                     if not mmExists : 
                         status = False
 
-                    for mID in eval(mIDs) : 
-                        result = self.getDbMatteID(conn, mID)
+                    for mID in objectMattes.get(oID, []) : 
+                        result = records.get(mID)
 
                         if result : 
                             mID = result[1]
@@ -503,8 +536,6 @@ class MyForm(QtGui.QMainWindow):
 
                     info.update({assetName: {'info': tmpDict, 'status': status}})
 
-        conn.close()
-
         return info
 
 
@@ -527,76 +558,43 @@ class MyForm(QtGui.QMainWindow):
 
 
     # connect database
-    def getDbMatteID(self, conn, mID) : 
-        result = db.getMatteID(conn, mID)
-        info = []
-
-        if result : 
-            for each in result : 
-                info.append(each)
+    def getObjectIDRecords(self, assetNames) : 
+        """ {assetName: record} of assets in db """
+        conn = db.reader(str(self.ui.db_lineEdit.text()))
 
-            if len(info) == 1 : 
-                return info[0]
-
-            if len(info) > 1 : 
-                trace('More than one id match %s' % mID)
-                return info[0]
-
-        
-    def getObjectIDRecord(self, assetName) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
-        result = db.getAssetName(conn, assetName)
-        data = []
-
-        for each in result : 
-            data.append(each)
-
-        conn.close()
-
-        if len(data) == 1 : 
-            return data[0]
-
-        if len(data) > 1 :
-            trace('More than 1 asset match name')
-            return data[0]
+        return db.getAssetNames(conn, assetNames)
 
 
     def getAllDbMatteID(self) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
+        conn = db.reader(str(self.ui.db_lineEdit.text()))
         result = db.getAllMID(conn)
         ids = []
 
         for each in result : 
             ids.append(each[0])
 
-        conn.close()
-
         return ids
 
 
     def getAllDbOId(self) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
+        conn = db.reader(str(self.ui.db_lineEdit.text()))
         result = db.getAllOID(conn)
         ids = []
         
         for each in result : 
             ids.append(each[0])
 
-        conn.close()
-
         return ids
 
 
     def getAllDbMId(self) : 
-        conn = sqlite3.connect(str(self.ui.db_lineEdit.text()))
+        conn = db.reader(str(self.ui.db_lineEdit.text()))
         result = db.getAllOID(conn)
         ids = []
         
         for each in result : 
             ids.append(each[0])
 
-        conn.close()
-
         return ids
 
 
@@ -782,6 +780,19 @@ class MyForm(QtGui.QMainWindow):
 
 
 
+# request of setAssetListUI. scene assets are listed before, in the main thread 
+
+def fetchAssetData(dbPath, assetNames) : 
+    """ ({assetName: record}, {oID: [mID, ...]}, {mID: record}) of assets in db """
+    records = db.serviceLookup(dbPath, 'ObjectID', 'AssetName', assetNames)
+
+    oIDs = [records[a][db.columnIndex['ObjectID']['oID']] for a in records]
+    objectMattes = db.getMatteIDsOfObjects(db.reader(dbPath), oIDs)
+    matteRecords = db.serviceLookup(dbPath, 'MatteID', 'mID', [a for mIDs in objectMattes.values() for a in mIDs])
+
+    return records, objectMattes, matteRecords
+
+
 def deleteUI(ui) : 
     if mc.window(ui, exists = True) : 
         mc.deleteUI(ui)
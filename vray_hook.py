@@ -14,6 +14,14 @@ def readDb(project) :
 
     return dbResult, db.dbPathCustom(project, dbName='vrayMatteID_res')
 
+def openDb(project) : 
+    """ create default db file if not exists. return its path without reading records """ 
+    return db.openDatabase(project, dbName='vrayMatteID_res')
+
+def dbPath(project) : 
+    """ path of db file. the share is not touched, so it also works while it is down """ 
+    return db.dbPathCustom(project, dbName='vrayMatteID_res')
+
 
 def listMtlNode() : 
     """ list material """